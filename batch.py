@@ -0,0 +1,52 @@
+import numpy as np
+
+import chess
+import search
+
+# batch features over many boards at once, a batch is an (N, 120) uint8
+# array of ChessBoard.board bytes, see boards. Squares run from a8 to h1
+# like chess._SQUARES, planes follow PIECES: white pawn to king, then black.
+PIECES = (2, 3, 4, 5, 6, 7, 34, 35, 36, 37, 38, 39)
+
+_SQUARES = np.array(chess._SQUARES, dtype=np.intp)
+
+# plane of every piece byte, castling flags included, 12 for empty squares
+_PLANES = np.full(256, len(PIECES), dtype=np.uint8)
+for _plane, _piece in enumerate(PIECES):
+    _PLANES[_piece] = _PLANES[_piece | 8] = _plane
+del _plane, _piece
+
+# search's material and piece-square scores, positive for white
+_SCORES = np.array(search._SCORES, dtype=np.int32).reshape(64, 128)
+
+def boards(chess_boards):
+    # bytes-like data of boards back to back is used without a copy, a
+    # sequence of ChessBoards or board bytes is joined once
+    if not isinstance(chess_boards, (bytes, bytearray, memoryview)):
+        chess_boards = b''.join(getattr(chess_board, 'board', chess_board) for chess_board in chess_boards)
+    return np.frombuffer(chess_boards, dtype=np.uint8).reshape(-1, 120)
+
+def players(chess_boards):
+    # True where white is to move
+    return np.fromiter((chess_board.player for chess_board in chess_boards), dtype=bool)
+
+def squares(array):
+    # (N, 64) piece bytes from a8 to h1
+    return array[:, _SQUARES]
+
+def material(array):
+    # (N, 12) piece counts in the order of PIECES
+    n, size = len(array), len(PIECES) + 1
+    planes = _PLANES[squares(array)] + np.arange(0, n * size, size)[:, None]
+    return np.bincount(planes.ravel(), minlength=n * size).reshape(n, size)[:, :-1]
+
+def scores(array, player=None):
+    # material and piece-square scores as search.evaluate, for white or,
+    # given the players, for the player to move
+    total = _SCORES[squares(array), _SQUARES].sum(axis=1)
+    return total if player is None else np.where(player, total, -total)
+
+def planes(array):
+    # (N, 12, 8, 8) one-hot uint8 planes, rank 8 first
+    one_hot = _PLANES[squares(array)][:, None, :] == np.arange(len(PIECES), dtype=np.uint8)[None, :, None]
+    return one_hot.view(np.uint8).reshape(-1, len(PIECES), 8, 8)
@@ -0,0 +1,129 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+import chess
+
+# perft results from: https://www.chessprogramming.org/Perft_Results
+POSITIONS = {
+    'initial': (chess.START_FEN, (20, 400, 8902, 197281, 4865609)),
+    'position2': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -',
+                  (48, 2039, 97862, 4085603)),
+    'position3': ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -', (14, 191, 2812, 43238, 674624)),
+    'position4': ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq -',
+                  (6, 264, 9467, 422333)),
+    'position5': ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ -', (44, 1486, 62379, 2103487)),
+    'position6': ('r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - -',
+                  (46, 2079, 89890, 3894594))
+}
+
+def load_position(name):
+    return chess.ChessBoard.from_fen(POSITIONS[name][0])
+
+def run(names, depth, mutable=False, pool=None):
+    positions = ((name, load_position(name), POSITIONS[name][1]) for name in names)
+    return list(_perft(positions, depth, mutable, pool))
+
+def read_suite(f):
+    # EPD perft suite records, the expected counts are the D1, D2, ... operations
+    for n, (chess_board, ops) in enumerate(chess.read_epd(f), 1):
+        expected = []
+        while f'D{len(expected) + 1}' in ops:
+            expected.append(int(ops[f'D{len(expected) + 1}']))
+        yield ops.get('id', f'#{n}'), chess_board, expected
+
+def run_epd(f, depth, mutable=False, pool=None):
+    # streams the records, a record without counts is only checked to parse
+    # and to leave the player not to move out of check
+    for name, chess_board, expected in read_suite(f):
+        if not expected:
+            king = chess_board.b_king if chess_board.player else chess_board.w_king
+            ok = not chess._under_attack(chess_board.board, king, chess_board.player)
+            yield {'position': name, 'depth': 0, 'nodes': 0, 'expected': 0, 'ok': ok,
+                   'seconds': 0.0, 'nps': None}
+        yield from _perft([(name, chess_board, expected)], depth, mutable, pool)
+
+def _perft(positions, depth, mutable, pool):
+    for name, chess_board, expected in positions:
+        for d in range(1, min(depth, len(expected)) + 1):
+            start = time.perf_counter()
+            if pool is not None:
+                nodes = pool.perft(chess_board, d)
+            elif mutable:
+                nodes = chess.Position(chess_board).perft(d)
+            else:
+                nodes = chess.perft(chess_board, d)
+            seconds = time.perf_counter() - start
+            yield {
+                'position': name,
+                'depth': d,
+                'nodes': nodes,
+                'expected': expected[d - 1],
+                'ok': nodes == expected[d - 1],
+                'seconds': round(seconds, 6),
+                'nps': round(nodes / seconds) if seconds else None
+            }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='perft correctness and throughput benchmark')
+    parser.add_argument('positions', nargs='*', metavar='position',
+                        help=f"any of: {', '.join(POSITIONS)} (default: all)")
+    parser.add_argument('-d', '--depth', type=int, default=3, help='maximum depth (default: 3)')
+    parser.add_argument('--mutable', action='store_true',
+                        help='make and unmake moves on a Position instead of calling move()')
+    parser.add_argument('-j', '--workers', type=int,
+                        help='split root moves across this many processes (implies --mutable)')
+    parser.add_argument('--epd', metavar='FILE',
+                        help='run the D1, D2, ... perft counts of an EPD suite instead')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+    for name in args.positions:
+        if name not in POSITIONS:
+            parser.error(f'unknown position: {name}')
+    if args.epd and args.positions:
+        parser.error('positions cannot be combined with --epd')
+
+    def results(pool=None):
+        if args.epd:
+            with open(args.epd) as f:
+                return list(run_epd(f, args.depth, args.mutable, pool))
+        return run(args.positions or list(POSITIONS), args.depth, args.mutable, pool)
+
+    try:
+        if args.workers:
+            import parallel
+            with parallel.Pool(args.workers) as pool:
+                results = results(pool)
+        else:
+            results = results()
+    except (OSError, chess.FenError) as e:
+        parser.error(str(e))
+    nodes = sum(r['nodes'] for r in results)
+    seconds = sum(r['seconds'] for r in results)
+    if args.json:
+        json.dump({
+            'python': platform.python_version(),
+            'mode': 'mutable' if args.mutable or args.workers else 'move',
+            'workers': args.workers or 1,
+            'results': results,
+            'nodes': nodes,
+            'seconds': round(seconds, 6),
+            'nps': round(nodes / seconds) if seconds else None
+        }, sys.stdout, indent=2)
+        print()
+    else:
+        for r in results:
+            if not r['depth']:
+                if not r['ok']:
+                    print('%-10s illegal, the player not to move is in check' % r['position'])
+                continue
+            print('%-10s %d %10d %10d %-4s %9.3fs %10s nps' % (
+                r['position'], r['depth'], r['nodes'], r['expected'],
+                'ok' if r['ok'] else 'FAIL', r['seconds'], r['nps']))
+        print('total %d nodes in %.3fs (%d nps)' % (nodes, seconds, nodes / seconds if seconds else 0))
+    return 0 if all(r['ok'] for r in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,10 @@
 import re
+import random
+import time
 
 from typing import NamedTuple
-from functools import partial
 
 #TODO: move tests to separate folder
-#TODO: implement AI opponent
 
 W_PIECES = ('\u2659', '\u2658', '\u2657', '\u2656', '\u2655', '\u2654')
 B_PIECES = ('\u265F', '\u265E', '\u265D', '\u265C', '\u265B', '\u265A')
@@ -12,6 +12,121 @@ B_PIECES = ('\u265F', '\u265E', '\u265D', '\u265C', '\u265B', '\u265A')
 class MoveError(Exception): pass
 class SquareError(Exception): pass
 class PromotionError(Exception): pass
+class FenError(Exception): pass
+
+_KNIGHT_OFFSETS = (-21, -19, -12, -8, 8, 12, 19, 21)
+_KING_OFFSETS = (-11, -10, -9, -1, 1, 9, 10, 11)
+_BISHOP_DIRECTIONS = (-11, -9, 9, 11)
+_ROOK_DIRECTIONS = (-10, -1, 1, 10)
+
+def _on_board(i):
+    return 2 <= i // 10 <= 9 and 1 <= i % 10 <= 8
+
+def _ray(square, direction):
+    ray = []
+    while _on_board(square + direction):
+        square += direction
+        ray.append(square)
+    return tuple(ray)
+
+_SQUARES = tuple(i for i in range(120) if _on_board(i))
+
+# movement tables for all 120 squares, empty off the board: knight and king
+# targets, and the sliding rays ordered outward from the square
+_KNIGHT_TARGETS = tuple(tuple(i+j for j in _KNIGHT_OFFSETS if _on_board(i) and _on_board(i+j)) for i in range(120))
+_KING_TARGETS = tuple(tuple(i+j for j in _KING_OFFSETS if _on_board(i) and _on_board(i+j)) for i in range(120))
+_BISHOP_RAYS = tuple(tuple(_ray(i, j) for j in _BISHOP_DIRECTIONS if _on_board(i) and _ray(i, j)) for i in range(120))
+_ROOK_RAYS = tuple(tuple(_ray(i, j) for j in _ROOK_DIRECTIONS if _on_board(i) and _ray(i, j)) for i in range(120))
+_QUEEN_RAYS = tuple(bishop + rook for bishop, rook in zip(_BISHOP_RAYS, _ROOK_RAYS))
+
+# packed moves: from square | to square << 7 | promotion piece << 14 | flags
+CASTLE = 1 << 17
+EN_PASSANT = 1 << 18
+
+# zobrist keys: one per piece byte and square, the castling flag is part of
+# the piece byte, an empty square and a missing en passant hash to 0
+_random = random.Random(0x3C4E55)
+_ZOBRIST = tuple(_random.getrandbits(64) if piece else 0 for piece in range(64) for _ in range(128))
+_ZOBRIST_EN_PASSANT = (0, *(_random.getrandbits(64) for _ in range(1, 120)))
+_ZOBRIST_BLACK = _random.getrandbits(64)
+del _random
+
+# material signature: a 4 bit count per color for pawns, knights, light and
+# dark squared bishops, rooks and queens, summed over the pieces on the board
+def _light(i):
+    return (i%10 + 10 - i//10) % 2 == 1
+
+_SIGNATURE = [0] * (64 << 7)
+for _piece, _shift in ((2, 0), (3, 4), (5, 16), (6, 20)):
+    for _i in _SQUARES:
+        for _color, _offset in ((0, 0), (32, 24)):
+            _SIGNATURE[(_color | _piece) << 7 | _i] = _SIGNATURE[(_color | _piece | 8) << 7 | _i] = 1 << _shift + _offset
+for _i in _SQUARES:
+    for _color, _offset in ((0, 0), (32, 24)):
+        _SIGNATURE[(_color | 4) << 7 | _i] = 1 << (8 if _light(_i) else 12) + _offset
+del _piece, _shift, _i, _color, _offset
+
+def _signatures(pieces):
+    # every signature of one side's pieces written like 'KBN', where B is a
+    # bishop on either color, L a light and D a dark squared bishop
+    signatures = [0]
+    for piece in pieces:
+        if piece == 'B':
+            signatures = [s + (1 << shift) for s in signatures for shift in (8, 12)]
+        elif piece != 'K':
+            signatures = [s + (1 << {'P': 0, 'N': 4, 'L': 8, 'D': 12, 'R': 16, 'Q': 20}[piece]) for s in signatures]
+    return signatures
+
+# material that cannot force mate, each entry holds for either color
+_DRAW_RULES = [
+    ## obvious draws
+    ('K', 'K'),
+    ('K', 'KN'),
+    ('K', 'KB'),
+    ('KL', 'KL'), # KB vs KB if bishops on same color
+    ('KD', 'KD'),
+    ## simple heuristics
+    ('K', 'KNN'),
+    ('KB', 'KNN'),
+    ('KN', 'KNN'),
+    ('KB', 'KN'),
+    ('KN', 'KN'),
+    ('KN', 'KBN'),
+    ('KB', 'KBN')
+]
+_DRAWS = frozenset(
+    white | black << 24
+    for a, b in _DRAW_RULES for w, bl in ((a, b), (b, a))
+    for white in _signatures(w) for black in _signatures(bl)
+)
+
+# FEN piece letters, an empty board and the castling rights with the king
+# and rook squares they need
+_FEN_PIECES = {'P': 2, 'N': 3, 'B': 4, 'R': 5, 'Q': 6, 'K': 7, 'p': 34, 'n': 35, 'b': 36, 'r': 37, 'q': 38, 'k': 39}
+_FEN_SYMBOLS = {piece: symbol for symbol, piece in _FEN_PIECES.items()}
+_EMPTY_BOARD = bytes(0 if _on_board(i) else 255 for i in range(120))
+_CASTLING = (('K', 95, 98), ('Q', 95, 91), ('k', 25, 28), ('q', 25, 21))
+
+# SAN moves, the check and annotation suffixes are accepted and ignored
+_SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?[+#]?[!?]*$')
+_SAN_CASTLE = re.compile(r'^(O-O-O|O-O|0-0-0|0-0)[+#]?[!?]*$')
+
+# 4 bit square codes of the packed encoding: empty, the white pawn to king, a
+# white rook that may castle, the pawn that can be taken en passant, then the
+# same for black. The castling flags of the kings go in the flags byte.
+_CODE_PIECES = (0, 2, 3, 4, 5, 6, 7, 13, 0, 34, 35, 36, 37, 38, 39, 45)
+_PIECE_CODES = [0] * 64
+for _code, _piece in enumerate(_CODE_PIECES):
+    if _piece and _code not in (7, 15):
+        _PIECE_CODES[_piece] = _PIECE_CODES[_piece | 8] = _code
+_PIECE_CODES[13], _PIECE_CODES[45] = 7, 15
+del _code, _piece
+PACKED_BYTES = 33
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# rules cache shared by legal_moves, ChessBoard.__bool__ and ChessBoard.material
+_cache = None
 
 class ChessBoard(NamedTuple):
     board: bytes
@@ -21,6 +136,24 @@ class ChessBoard(NamedTuple):
     w_king: int
     b_king: int
     check: bool = False
+    key: int = None # zobrist key, computed on demand by zobrist() when missing
+    pieces: tuple = None # white and black piece squares, computed on demand when missing
+    signature: int = None # material signature, computed on demand when missing
+
+    # key, pieces and signature are caches derived from the board: they are
+    # left out of == and hash, and must be cleared to None when the board is
+    # replaced, as in _replace(board=..., key=None, pieces=None, signature=None)
+    def __eq__(self, other):
+        if isinstance(other, ChessBoard):
+            return tuple.__eq__(self[:7], other[:7])
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(self[:7])
 
     def __repr__(self) -> str:
         r = f"  {''.join('%2s' % c for c in 'abcdefgh')}\n"
@@ -42,90 +175,464 @@ class ChessBoard(NamedTuple):
         return r
 
     def __bool__(self) -> bool:
-        if self.player:
-            pieces = [i for i, _ in enumerate(self.board) if 0 < self.board[i] < 32]
+        if _cache is not None and not self.promoted:
+            return bool(_cached(self).moves)
+        # stops at the first legal move
+        for _ in iter_moves(self):
+            return True
+        return False
+
+    @classmethod
+    def from_fen(cls, fen):
+        # the half move clock and move number are accepted but not kept
+        fields = fen.split()
+        if len(fields) not in (4, 6):
+            raise FenError(f'{fen} is not a valid FEN!')
+        placement, player, castling, en_passant = fields[:4]
+        board = bytearray(_EMPTY_BOARD)
+        kings = {7: [], 39: []}
+        ranks = placement.split('/')
+        if len(ranks) != 8 or player not in ('w', 'b'):
+            raise FenError(f'{fen} is not a valid FEN!')
+        for row, rank in enumerate(ranks, 2):
+            i = row * 10 + 1
+            for c in rank:
+                if c in '12345678':
+                    i += int(c)
+                elif c in _FEN_PIECES and i < row * 10 + 9:
+                    board[i] = _FEN_PIECES[c]
+                    if c in 'Kk':
+                        kings[board[i]].append(i)
+                    i += 1
+                else:
+                    raise FenError(f'{fen} is not a valid FEN!')
+            if i != row * 10 + 9:
+                raise FenError(f'{fen} is not a valid FEN!')
+        w_kings, b_kings = kings[7], kings[39]
+        if len(w_kings) != 1 or len(b_kings) != 1:
+            raise FenError(f'{fen} needs one king of each color!')
+
+        if castling != '-':
+            for c in castling:
+                rights = [(king, rook) for symbol, king, rook in _CASTLING if symbol == c]
+                if not rights or castling.count(c) > 1:
+                    raise FenError(f'{fen} is not a valid FEN!')
+                king, rook = rights[0]
+                if board[king]&~40 != 7 or board[rook] != board[king]&32 | 5:
+                    raise FenError(f'{c} castling without king and rook at home!')
+                board[king] |= 8
+                board[rook] |= 8
+
+        # FEN names the square passed over, the board keeps the pawn's own
+        if en_passant == '-':
+            pawn = 0
+        else:
+            try:
+                target = _an2i(en_passant)
+            except SquareError:
+                raise FenError(f'{en_passant} is not a valid en passant square!')
+            pawn = target + 10 if player == 'w' else target - 10
+            if target // 10 != (4 if player == 'w' else 7) or board[pawn] != (34 if player == 'w' else 2):
+                raise FenError(f'{en_passant} is not a valid en passant square!')
+
+        return _complete(board, player == 'w', pawn, w_kings[0], b_kings[0])
+
+    def to_fen(self):
+        # there is no move counting, the clock and move number are always 0 1
+        board = self.board
+        ranks = []
+        for row in range(2, 10):
+            rank, empty = '', 0
+            for i in range(row * 10 + 1, row * 10 + 9):
+                if board[i]:
+                    if empty:
+                        rank += str(empty)
+                        empty = 0
+                    rank += _FEN_SYMBOLS[board[i]&~8]
+                else:
+                    empty += 1
+            ranks.append(rank + str(empty) if empty else rank)
+        castling = ''.join(
+            symbol for symbol, king, rook in _CASTLING
+            if board[king]&~32 == 15 and board[rook] == board[king]&32 | 13
+        )
+        if self.en_passant:
+            en_passant = _i2an(self.en_passant - 10 if self.player else self.en_passant + 10)
         else:
-            pieces = [i for i, _ in enumerate(self.board) if 32 <= self.board[i] < 64]
-        return any(map(partial(legal_moves, self, castle=False), pieces))
+            en_passant = '-'
+        return f"{'/'.join(ranks)} {'w' if self.player else 'b'} {castling or '-'} {en_passant} 0 1"
+
+    @classmethod
+    def from_bytes(cls, data):
+        # the inverse of to_bytes
+        flags = data[32]
+        player = bool(flags & 1)
+        board = bytearray(_EMPTY_BOARD)
+        en_passant = w_king = b_king = 0
+        for i in range(32):
+            for square, code in ((_SQUARES[2*i], data[i] & 15), (_SQUARES[2*i + 1], data[i] >> 4)):
+                if code == 8:
+                    board[square] = 34 if player else 2
+                    en_passant = square
+                else:
+                    board[square] = _CODE_PIECES[code]
+                    if code == 6:
+                        w_king = square
+                    elif code == 14:
+                        b_king = square
+        board[w_king] |= (flags & 2) << 2
+        board[b_king] |= (flags & 4) << 1
+        return _complete(board, player, en_passant, w_king, b_king)
+
+    def to_bytes(self):
+        # 33 bytes: two squares to a byte from a8 to h1, low bits first, then
+        # the player and the castling flags of the white and black king
+        if self.promoted:
+            raise PromotionError('pending promotion!')
+        board = self.board
+        codes = [_PIECE_CODES[board[i]] for i in _SQUARES]
+        if self.en_passant:
+            codes[(self.en_passant//10 - 2) * 8 + self.en_passant%10 - 1] = 8
+        flags = self.player | (board[self.w_king]&8) >> 2 | (board[self.b_king]&8) >> 1
+        return bytes([*(codes[i] | codes[i+1] << 4 for i in range(0, 64, 2)), flags])
 
     @property
     def material(self):
-        wp = sorted(i&7 for i in self.board if 0 < i < 32)
-        bp = sorted(i&7 for i in self.board if 32 <= i < 64)
-        ## obvious draws
-        # K vs K
-        if [7] == wp == bp:
-            return False
-        # K vs KN
-        elif (wp == [7] and bp == [3, 7]) or (bp == [7] and wp == [3, 7]):
-            return False 
-        # K vs KB
-        elif (wp == [7] and bp == [4, 7]) or (bp == [7] and wp == [4, 7]):
-            return False
-        # KB vs KB if bishops on same color
-        elif [4, 7] == wp == bp:
-            bishops = [i&7 for i in self.board if i == 4]
-            if all(map(lambda x: sum([10 - x//10, x % 10]) % 2 == 0, bishops)):
-                return False
-        ## simple heuristics
-        # K  vs KNN
-        elif (wp == [7] and bp == [3, 3, 7]) or (bp == [7] and wp == [3, 3, 7]):
-            return False
-        # KB vs KNN
-        elif (wp == [2, 7] and bp == [3, 3, 7]) or (wp == [2, 7] and bp == [3, 3, 7]):
-            return False
-        # KN vs KNN
-        elif (wp == [3, 7] and bp == [3, 3, 7]) or (bp == [3, 7] and wp == [3, 3, 7]):
-            return False
-        # KB vs KN
-        elif (wp == [2, 7] and bp == [3, 7]) or (bp == [2, 7] and wp == [3, 7]):
-            return False
-        # KN vs KN
-        elif [3, 7] == wp == bp:
-            return False
-        # KN vs KBN
-        elif (wp == [3, 7] and bp == [3, 4, 7]) or (bp == [3, 7] and wp == [3, 4, 7]):
-            return False
-        # KB vs KBN
-        elif (wp == [4, 7] and bp == [3, 4, 7]) or (bp == [4, 7] and wp == [3, 4, 7]):
+        signature = self.signature if self.signature is not None else _signature(self.board)
+        return signature not in _DRAWS
+
+    def squares(self, player, piece=0):
+        # squares of the player's pieces, only those of one type when piece is given
+        pieces = (self.pieces or _pieces(self.board))[0 if player else 1]
+        if piece:
+            return frozenset(i for i in pieces if self.board[i]&7 == piece)
+        return pieces
+
+class Position:
+    """Mutable position for search, moves are made and unmade in place."""
+
+    __slots__ = ('board', 'player', 'en_passant', 'promoted', 'w_king', 'b_king', 'check', 'key', 'pieces', 'signature', '_undo')
+
+    def __init__(self, chess_board):
+        self.board = _copy_board(chess_board.board)
+        self.player = chess_board.player
+        self.en_passant = chess_board.en_passant
+        self.promoted = chess_board.promoted
+        self.w_king = chess_board.w_king
+        self.b_king = chess_board.b_king
+        self.check = chess_board.check
+        self.key = chess_board.key if chess_board.key is not None else zobrist(chess_board)
+        self.pieces = [set(squares) for squares in chess_board.pieces or _pieces(chess_board.board)]
+        self.signature = chess_board.signature if chess_board.signature is not None else _signature(self.board)
+        self._undo = []
+
+    def to_board(self):
+        return ChessBoard(
+            bytes(self.board),
+            self.player,
+            self.en_passant,
+            self.promoted,
+            self.w_king,
+            self.b_king,
+            self.check,
+            self.key,
+            tuple(map(frozenset, self.pieces)),
+            self.signature
+        )
+
+    def make(self, packed):
+        if self.promoted:
+            raise PromotionError('pending promotion!')
+        board = self.board
+        square, target = packed & 127, packed >> 7 & 127
+        piece, captured = board[square], board[target]
+        undo = (packed, piece, captured, self.en_passant, self.check, self.key, self.signature)
+
+        board[target], board[square] = piece&~8, 0
+        if packed >> 14 & 7:
+            board[target] = piece&32 | packed >> 14 & 7
+        own, other = self.pieces if self.player else self.pieces[::-1]
+        own.remove(square)
+        own.add(target)
+        if captured:
+            other.remove(target)
+        key = (self.key ^ _ZOBRIST[piece << 7 | square] ^ _ZOBRIST[captured << 7 | target] ^
+               _ZOBRIST[board[target] << 7 | target])
+        self.signature += (_SIGNATURE[board[target] << 7 | target] - _SIGNATURE[piece << 7 | square] -
+                           _SIGNATURE[captured << 7 | target])
+        if packed & CASTLE:
+            rook, to = (square+3, target-1) if target == square+2 else (square-4, target+1)
+            key ^= _ZOBRIST[board[rook] << 7 | rook] ^ _ZOBRIST[(board[rook]&~8) << 7 | to]
+            board[to], board[rook] = board[rook]&~8, 0
+            own.remove(rook)
+            own.add(to)
+        elif packed & EN_PASSANT:
+            pawn = square - square%10 + target%10
+            key ^= _ZOBRIST[board[pawn] << 7 | pawn]
+            self.signature -= _SIGNATURE[board[pawn] << 7 | pawn]
+            board[pawn] = 0
+            other.remove(pawn)
+        cleared = _castling(board) if piece&8 or captured&8 else ()
+        for i in cleared:
+            key ^= _ZOBRIST[(board[i] | 8) << 7 | i] ^ _ZOBRIST[board[i] << 7 | i]
+        self._undo.append((*undo, cleared))
+
+        if piece&7 == 7:
+            if self.player:
+                self.w_king = target
+            else:
+                self.b_king = target
+        en_passant = target if piece&7 == 2 and abs(square - target) == 20 else 0
+        self.key = key ^ _ZOBRIST_BLACK ^ _ZOBRIST_EN_PASSANT[self.en_passant] ^ _ZOBRIST_EN_PASSANT[en_passant]
+        self.en_passant = en_passant
+        self.check = _under_attack(board, self.b_king if self.player else self.w_king, self.player)
+        self.player = not self.player
+
+    def unmake(self):
+        packed, piece, captured, self.en_passant, self.check, self.key, self.signature, cleared = self._undo.pop()
+        self.player = not self.player
+        board = self.board
+        square, target = packed & 127, packed >> 7 & 127
+
+        board[square], board[target] = piece, captured
+        own, other = self.pieces if self.player else self.pieces[::-1]
+        own.remove(target)
+        own.add(square)
+        if captured:
+            other.add(target)
+        if packed & CASTLE:
+            rook, to = (square+3, target-1) if target == square+2 else (square-4, target+1)
+            board[rook], board[to] = piece&32 | 13, 0
+            own.remove(to)
+            own.add(rook)
+        elif packed & EN_PASSANT:
+            pawn = square - square%10 + target%10
+            board[pawn] = piece&32 ^ 32 | 2
+            other.add(pawn)
+        for i in cleared:
+            board[i] |= 8
+
+        if piece&7 == 7:
+            if self.player:
+                self.w_king = square
+            else:
+                self.b_king = square
+
+    def repetitions(self):
+        # earlier occurrences of this position with the same player to move
+        return sum(undo[5] == self.key for undo in self._undo[-2::-2])
+
+    def perft(self, depth):
+        if depth == 0:
+            return 1
+        moves = generate_moves(self)
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for packed in moves:
+            self.make(packed)
+            nodes += self.perft(depth - 1)
+            self.unmake()
+        return nodes
+
+class TranspositionTable:
+    """Fixed size table keyed by zobrist key, an entry is replaced by a
+    deeper or equally deep one, or by anything once it is from an older
+    generation. Slot count is derived from the memory cap and entry_bytes,
+    the expected size of one entry with its value."""
+
+    def __init__(self, max_bytes=64 << 20, entry_bytes=1024):
+        self.slots = 1 << max(0, (max_bytes // entry_bytes).bit_length() - 1)
+        self.max_bytes = max_bytes
+        self.clear()
+
+    def clear(self):
+        self._table = [None] * self.slots
+        self._mask = self.slots - 1
+        self.generation = 0
+        self.entries = self.hits = self.misses = self.stores = self.replacements = 0
+
+    def new_generation(self):
+        self.generation += 1
+
+    def probe(self, key):
+        entry = self._table[key & self._mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[3]
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value):
+        index = key & self._mask
+        entry = self._table[index]
+        if entry is None:
+            self.entries += 1
+        elif entry[0] != key and entry[2] == self.generation and entry[1] > depth:
             return False
+        elif entry[0] != key:
+            self.replacements += 1
+        self._table[index] = (key, depth, self.generation, value)
+        self.stores += 1
         return True
 
+    @property
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'slots': self.slots,
+            'entries': self.entries,
+            'max_bytes': self.max_bytes,
+            'generation': self.generation,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / probes if probes else 0.0,
+            'stores': self.stores,
+            'replacements': self.replacements
+        }
+
+def enable_cache(max_bytes=64 << 20):
+    global _cache
+    _cache = TranspositionTable(max_bytes)
+    return _cache
+
+def disable_cache():
+    global _cache
+    _cache = None
+
+def cache_stats():
+    return _cache.stats if _cache is not None else None
+
+# opt-in profiling of the rules' hot paths: while it is on the functions are
+# swapped for wrappers counting calls and inclusive time, off it costs nothing
+_PROFILED = ('legal_moves', '_under_attack', '_apply_move', '_move_piece', '_copy_board', 'move')
+_profile = None
+_unprofiled = {}
+
+def enable_profile():
+    # starts with fresh counters
+    global _profile
+    disable_profile()
+    _profile = {name: [0, 0.0, 0] for name in (*_PROFILED, '__bool__')}
+    for name in _PROFILED:
+        _unprofiled[name] = globals()[name]
+        globals()[name] = _timed(_unprofiled[name], _profile[name])
+    _unprofiled['__bool__'] = ChessBoard.__bool__
+    ChessBoard.__bool__ = _timed(ChessBoard.__bool__, _profile['__bool__'])
+
+def disable_profile():
+    global _profile
+    for name, function in _unprofiled.items():
+        if name == '__bool__':
+            ChessBoard.__bool__ = function
+        else:
+            globals()[name] = function
+    _unprofiled.clear()
+    _profile = None
+
+def stats():
+    # calls, inclusive seconds and raised errors per profiled function and
+    # the boards copied per move played, None when profiling is off
+    if _profile is None:
+        return None
+    moves = _profile['move'][0] - _profile['move'][2]
+    return {
+        **{name: {'calls': calls, 'seconds': seconds, 'errors': errors}
+           for name, (calls, seconds, errors) in _profile.items()},
+        'boards_per_move': _profile['_copy_board'][0] / moves if moves else 0.0
+    }
+
+def _timed(function, counter):
+    clock = time.perf_counter
+
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        except BaseException:
+            counter[2] += 1
+            raise
+        finally:
+            counter[0] += 1
+            counter[1] += clock() - start
+
+    timed.__name__ = timed.__qualname__ = function.__name__
+    timed.__doc__ = function.__doc__
+    return timed
+
 def new_game():
-    with open('board.bin', mode='rb') as f:
-        return ChessBoard(f.read(120), True, 0, 0, 95, 25)
+    return _START
+
+def read_epd(lines):
+    # yields a ChessBoard and the operations of every EPD record, an operand
+    # list is kept as one string without quotes, blank and # lines are skipped
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        head, *operations = line.split(';')
+        fields = head.split()
+        # perft suites write full FENs, the clocks are then dropped
+        if len(fields) == 6 and fields[4].isdigit() and fields[5].isdigit():
+            fields = fields[:4]
+        elif len(fields) > 4:
+            operations.insert(0, ' '.join(fields[4:]))
+        chess_board = ChessBoard.from_fen(' '.join(fields[:4]))
+        ops = {}
+        for operation in operations:
+            opcode, _, operand = operation.strip().partition(' ')
+            if opcode:
+                ops[opcode] = operand.strip().strip('"')
+        yield chess_board, ops
+
+def zobrist(chess_board):
+    key = _ZOBRIST_EN_PASSANT[chess_board.en_passant]
+    if not chess_board.player:
+        key ^= _ZOBRIST_BLACK
+    for square, piece in enumerate(chess_board.board):
+        if piece != 255:
+            key ^= _ZOBRIST[piece << 7 | square]
+    return key
+
+def status(chess_board):
+    if _cache is not None and not chess_board.promoted:
+        entry = _cached(chess_board)
+        if entry.status is None:
+            entry.status = _status(chess_board) or ''
+        return entry.status or None
+    return _status(chess_board)
 
 def promote(chess_board, choice):
-    board = bytearray(chess_board.board)
+    if not chess_board.promoted:
+        raise PromotionError('no pending promotion!')
+    board = _copy_board(chess_board.board)
+    # the pawn's own color, the player flag has already been handed over
+    color = board[chess_board.promoted]&32
     if choice == 1:
-        if chess_board.player:
-            board[chess_board.promoted] = 6
-        else:
-            board[chess_board.promoted] = 38
+        board[chess_board.promoted] = color | 6
     elif choice == 2:
-        if chess_board.player:
-            board[chess_board.promoted] = 5
-        else:
-            board[chess_board.promoted] = 37
+        board[chess_board.promoted] = color | 5
     elif choice == 3:
-        if chess_board.player:
-            board[chess_board.promoted] = 4
-        else:
-            board[chess_board.promoted] = 36
+        board[chess_board.promoted] = color | 4
     elif choice == 4:
-        if chess_board.player:
-            board[chess_board.promoted] = 3
-        else:
-            board[chess_board.promoted] = 35
+        board[chess_board.promoted] = color | 3
     else:
         raise PromotionError('invalid promotion!')
+    king = chess_board.b_king if color == 0 else chess_board.w_king
+    key = chess_board.key if chess_board.key is not None else zobrist(chess_board)
+    signature = chess_board.signature if chess_board.signature is not None else _signature(chess_board.board)
+    square = chess_board.promoted
     return ChessBoard(
         bytes(board),
         chess_board.player,
         chess_board.en_passant,
         0,
         chess_board.w_king,
-        chess_board.b_king
+        chess_board.b_king,
+        _under_attack(board, king, not color, en_passant=chess_board.en_passant),
+        key ^ _ZOBRIST[(color | 2) << 7 | square] ^ _ZOBRIST[board[square] << 7 | square],
+        chess_board.pieces,
+        signature - _SIGNATURE[(color | 2) << 7 | square] + _SIGNATURE[board[square] << 7 | square]
     )
 
 def move(chess_board, square, position):
@@ -136,6 +643,8 @@ def move(chess_board, square, position):
         else:
             raise MoveError(f'{symbol}{square} {position} invalid move!')
 
+    if chess_board.promoted:
+        raise PromotionError('pending promotion!')
     s = _an2i(square)
     if chess_board.board[s] == 0: # square to move from is empty
         raise SquareError(f'{square} is empty!')
@@ -155,7 +664,7 @@ def move(chess_board, square, position):
             invalid_move(symbol)
 
     # cannot move opponent's piece or attack own pieces
-    if any([chess_board.player == chess_board.board[s]&32,
+    if any([chess_board.player != (chess_board.board[s]&32 == 0),
             chess_board.board[target] and chess_board.board[s]&32 == chess_board.board[target]&32]):
         invalid_move(symbol)
 
@@ -178,18 +687,7 @@ def move(chess_board, square, position):
 
     # set en passant flag
     if next_board[target]&7 == 2 and abs(s - target) == 20:
-        en_passant = target 
-    # update king's castling rights
-    elif next_board[target] == 5: ## ♖
-        if next_board[king] == 15:
-            next_board[king] = 7 # remove castling flag
-    elif next_board[target] == 37: ## ♜
-        if next_board[king] == 47:
-            next_board[king] = 39 # remove castling flag
-    elif next_board[target] == 15: ## ♔
-        next_board[target] = 7 # remove castling flag
-    elif next_board[target] == 47: ## ♚
-        next_board[target] = 39 # remove castling flag
+        en_passant = target
 
     # set the check flag
     if _under_attack(next_board, next_king, chess_board.player, en_passant=en_passant):
@@ -197,58 +695,416 @@ def move(chess_board, square, position):
     else:
         check = False
 
+    # update the zobrist key, piece squares and material signature
+    changed = _changed(chess_board.board, next_board, s, target)
+    key = chess_board.key if chess_board.key is not None else zobrist(chess_board)
+    key ^= _ZOBRIST_BLACK ^ _ZOBRIST_EN_PASSANT[chess_board.en_passant] ^ _ZOBRIST_EN_PASSANT[en_passant]
+    signature = chess_board.signature if chess_board.signature is not None else _signature(chess_board.board)
+    for i in changed:
+        key ^= _ZOBRIST[chess_board.board[i] << 7 | i] ^ _ZOBRIST[next_board[i] << 7 | i]
+        signature += _SIGNATURE[next_board[i] << 7 | i] - _SIGNATURE[chess_board.board[i] << 7 | i]
+    white, black = chess_board.pieces or _pieces(chess_board.board)
+    pieces = (white.difference(changed).union(i for i in changed if 0 < next_board[i] < 32),
+              black.difference(changed).union(i for i in changed if 32 <= next_board[i] < 64))
+
     return ChessBoard(
         bytes(next_board),
         not chess_board.player,
         en_passant,
         promoted,
         *((king, next_king) if chess_board.player else (next_king, king)),
-        check
+        check,
+        key,
+        pieces,
+        signature
     )
 
 def legal_moves(chess_board, square, castle=False):
-    moves = _move_piece(
-        chess_board.board,
-        square,
-        en_passant=chess_board.en_passant,
-        castle=castle and not chess_board.check
-    )
+    board = chess_board.board
+    if (_cache is not None and not chess_board.promoted and
+            board[square] and chess_board.player != bool(board[square]&32)):
+        entry = _cached(chess_board)
+        if entry.targets is None:
+            entry.targets = {}
+            for packed in entry.moves:
+                entry.targets.setdefault(packed & 127, set()).add(packed >> 7 & 127)
+            entry.targets = {i: frozenset(targets) for i, targets in entry.targets.items()}
+        moves = entry.targets.get(square, frozenset())
+        if not castle and board[square]&7 == 7:
+            moves = frozenset(move for move in moves if abs(move - square) != 2)
+        return moves
+    king = chess_board.b_king if board[square]&32 else chess_board.w_king
+    return _legal_moves(board, square, king, chess_board.en_passant, castle, *_checks_and_pins(board, king))
+
+def generate_moves(chess_board, moves=None):
+    # every legal move of the player to move packed into an int, filled into
+    # the given list or array buffer when one is passed in for reuse
+    if moves is None:
+        moves = []
+    else:
+        del moves[:]
+    board = chess_board.board
+    color = 0 if chess_board.player else 32
+    king = chess_board.w_king if chess_board.player else chess_board.b_king
+    evasions, pins = _checks_and_pins(board, king)
+
+    # king steps are tested with the king lifted off the board
+    next_board = _copy_board(board)
+    next_board[king] = 0
+    for target in _KING_TARGETS[king]:
+        if (board[target] == 0 or board[target]&32 != color) and not _under_attack(next_board, target, color):
+            moves.append(king | target << 7)
+    if evasions is None and board[king]&8:
+        for target in _castle_targets(board, next_board, king, color):
+            moves.append(king | target << 7 | CASTLE)
+    if evasions is not None and not evasions: # double check
+        return moves
+    moves.extend(_piece_moves(chess_board, (chess_board.pieces or _pieces(board))[0 if color == 0 else 1],
+                              king, color, evasions, pins, None))
+    return moves
+
+def iter_moves(chess_board, quiet=True):
+    # the legal moves of generate_moves made lazily in stages, so a caller can
+    # stop at the first one: in check the king steps, then captures of the
+    # checker and then blocks, otherwise captures and promotions before the
+    # quiet moves. Without quiet only captures and promotions are made
+    board = chess_board.board
+    color = 0 if chess_board.player else 32
+    king = chess_board.w_king if chess_board.player else chess_board.b_king
+    evasions, pins = _checks_and_pins(board, king)
+    pieces = (chess_board.pieces or _pieces(board))[0 if color == 0 else 1]
+
+    # king steps are tested with the king lifted off the board
+    next_board = _copy_board(board)
+    next_board[king] = 0
+    if evasions is not None:
+        yield from _king_moves(board, next_board, king, color, True, quiet)
+        if not evasions: # double check
+            return
+        yield from _piece_moves(chess_board, pieces, king, color, evasions, pins, True)
+        if quiet:
+            yield from _piece_moves(chess_board, pieces, king, color, evasions, pins, False)
+        return
+    yield from _king_moves(board, next_board, king, color, True, False)
+    yield from _piece_moves(chess_board, pieces, king, color, None, pins, True)
+    if quiet:
+        yield from _king_moves(board, next_board, king, color, False, True)
+        yield from _piece_moves(chess_board, pieces, king, color, None, pins, False)
+
+def _king_moves(board, next_board, king, color, captures, quiet):
+    for target in _KING_TARGETS[king]:
+        if (quiet if board[target] == 0 else captures and board[target]&32 != color) and \
+                not _under_attack(next_board, target, color):
+            yield king | target << 7
+    # castling is quiet and never out of check, evasions are made with captures set
+    if quiet and not captures and board[king]&8:
+        for target in _castle_targets(board, next_board, king, color):
+            yield king | target << 7 | CASTLE
+
+def _piece_moves(chess_board, pieces, king, color, evasions, pins, captures):
+    # captures, en passant and promotions, or the remaining quiet moves, or
+    # all of them when captures is None
+    board = chess_board.board
+    last = 2 if color == 0 else 9
+    en_passant = chess_board.en_passant
+    for square in pieces:
+        piece = board[square]&7
+        if piece == 7:
+            continue
+        if piece == 2 and en_passant and captures is not False and abs(en_passant - square) == 1 and \
+                square // 10 == (5 if color == 0 else 6):
+            target = en_passant + (-10 if color == 0 else 10)
+            if not _under_attack(_apply_move(board, square, target, False), king, color):
+                yield square | target << 7 | EN_PASSANT
+        pin = pins.get(square)
+        for target in _piece_targets(board, square, piece, color, captures):
+            if pin is not None and target not in pin:
+                continue
+            if evasions is not None and target not in evasions:
+                continue
+            if piece == 2 and target // 10 == last:
+                for promotion in (6, 5, 4, 3):
+                    yield square | target << 7 | promotion << 14
+            else:
+                yield square | target << 7
+
+def _piece_targets(board, square, piece, color, captures):
+    # pseudo legal targets of a pawn, knight or slider without en passant:
+    # captures and pawn pushes to the last rank when captures is set, the
+    # other quiet moves when it is False, all of them when it is None
+    targets = []
+    if piece == 2:
+        forward = -10 if color == 0 else 10
+        target = square + forward
+        if board[target] == 0:
+            if captures is None or captures == (target // 10 in {2, 9}):
+                targets.append(target)
+            if not captures and square // 10 == (8 if color == 0 else 3) and board[target+forward] == 0:
+                targets.append(target+forward)
+        if captures is not False:
+            for target in (target-1, target+1):
+                if board[target] not in {0, 255} and board[target]&32 != color:
+                    targets.append(target)
+    elif piece == 3:
+        for target in _KNIGHT_TARGETS[square]:
+            if board[target] == 0:
+                if not captures:
+                    targets.append(target)
+            elif captures is not False and board[target]&32 != color:
+                targets.append(target)
+    else:
+        for ray in (_BISHOP_RAYS if piece == 4 else _ROOK_RAYS if piece == 5 else _QUEEN_RAYS)[square]:
+            for target in ray:
+                if board[target] == 0:
+                    if not captures:
+                        targets.append(target)
+                else:
+                    if captures is not False and board[target]&32 != color:
+                        targets.append(target)
+                    break
+    return targets
+
+def _castle_targets(board, attacked, king, color):
+    # targets of the flagged king castling short and long, the squares it
+    # crosses are tested on attacked, the board with the king lifted off
+    targets = []
+    if (board[king+3] == color | 13 and
+            0 == board[king+1] == board[king+2] and
+            not _under_attack(attacked, king+1, color) and
+            not _under_attack(attacked, king+2, color)):
+        targets.append(king+2)
+    if (board[king-4] == color | 13 and
+            0 == board[king-1] == board[king-2] == board[king-3] and
+            not _under_attack(attacked, king-1, color) and
+            not _under_attack(attacked, king-2, color)):
+        targets.append(king-2)
+    return targets
+
+def play_move(chess_board, packed):
+    # play a packed move through the move validator
+    square, target, promotion = packed & 127, packed >> 7 & 127, packed >> 14 & 7
+    if packed & CASTLE:
+        position = '0-0' if target > square else '0-0-0'
+    else:
+        position = _i2an(target)
+    next_board = move(chess_board, _i2an(square), position)
+    if promotion:
+        next_board = promote(next_board, 7 - promotion)
+    return next_board
+
+def parse_san(chess_board, san):
+    # resolve a SAN move like Nbd7, exd6, e8=Q+ or O-O to its packed move
+    moves = generate_moves(chess_board)
+    m = _SAN_CASTLE.match(san)
+    if m:
+        king = chess_board.w_king if chess_board.player else chess_board.b_king
+        target = king - 2 if len(m[1]) == 5 else king + 2
+        candidates = [packed for packed in moves if packed & CASTLE and packed >> 7 & 127 == target]
+    else:
+        m = _SAN.match(san)
+        if not m:
+            raise MoveError(f'{san} is not a valid SAN move!')
+        piece = 'PNBRQK'.index(m[1] or 'P') + 2
+        target = _an2i(m[4])
+        promotion = 'PNBRQ'.index(m[5]) + 2 if m[5] else 0
+        candidates = [
+            packed for packed in moves
+            if packed >> 7 & 127 == target and not packed & CASTLE and
+            chess_board.board[packed & 127]&7 == piece and packed >> 14 & 7 == promotion and
+            (not m[2] or _i2an(packed & 127)[0] == m[2]) and
+            (not m[3] or _i2an(packed & 127)[1] == m[3])
+        ]
+    if len(candidates) != 1:
+        raise MoveError(f'{san} invalid move!' if not candidates else f'{san} is ambiguous!')
+    return candidates[0]
+
+def perft(chess_board, depth):
+    if depth == 0:
+        return 1
+    return sum(perft(next_board, depth - 1) for _, next_board in _successors(chess_board))
+
+def divide(chess_board, depth):
+    return {notation: perft(next_board, depth - 1) for notation, next_board in _successors(chess_board)}
+
+def _successors(chess_board):
+    for packed in generate_moves(chess_board):
+        yield _move2an(packed), play_move(chess_board, packed)
+
+def _legal_moves(board, square, king, en_passant, castle, evasions, pins):
+    color = board[square]&32
+    if board[square]&7 == 7:
+        # the king may not step along the line of a slider checking it
+        next_board = _copy_board(board)
+        next_board[square] = 0
+        moves = _move_piece(board, square, en_passant=en_passant, castle=castle and evasions is None)
+        return frozenset(move for move in moves if not _under_attack(next_board, move, color))
+    if evasions is not None and not evasions: # double check
+        return frozenset()
     legal_moves = []
-    for move in moves:
-        next_board = _apply_move(chess_board.board, square, move, castle)
-        if chess_board.board[square]&7 == 7:
-            king = move
+    for move in _move_piece(board, square, en_passant=en_passant):
+        if board[square]&7 == 2 and (move - square) % 10 and board[move] == 0:
+            # en passant removes two pawns from the board, test it on a copy
+            if not _under_attack(_apply_move(board, square, move, False), king, color):
+                legal_moves.append(move)
+        elif square in pins and move not in pins[square]:
+            continue
+        elif evasions is not None and move not in evasions:
+            continue
         else:
-            king = chess_board.b_king if chess_board.board[square]&32 else chess_board.w_king
-        if not _under_attack(next_board, king, chess_board.board[square]&32, en_passant=chess_board.en_passant):
             legal_moves.append(move)
     return frozenset(legal_moves)
 
+def _checks_and_pins(board, king):
+    # squares that capture or block a single check (None when not in check,
+    # empty on double check) and the line each pinned piece is bound to
+    color = board[king]&32
+    enemy = color ^ 32
+    checkers = 0
+    evasions = []
+    pins = {}
+    for i in ((-9, -11) if color else (9, 11)):
+        if board[king-i] == enemy | 2:
+            checkers += 1
+            evasions.append(king-i)
+    for i in _KNIGHT_TARGETS[king]:
+        if board[i] == enemy | 3:
+            checkers += 1
+            evasions.append(i)
+    for rays, slider in ((_BISHOP_RAYS[king], enemy | 4), (_ROOK_RAYS[king], enemy | 5)):
+        for ray in rays:
+            pinned = 0
+            for n, position in enumerate(ray, 1):
+                if board[position]:
+                    if board[position]&32 == color:
+                        if pinned:
+                            break
+                        pinned = position
+                    else:
+                        if board[position]&~8 in (slider, enemy | 6):
+                            if pinned:
+                                pins[pinned] = frozenset(ray[:n])
+                            else:
+                                checkers += 1
+                                evasions.extend(ray[:n])
+                        break
+    if checkers == 0:
+        return None, pins
+    return frozenset(evasions) if checkers == 1 else frozenset(), pins
+
 def _apply_move(board, square, target, castle):
-    next_board = bytearray(board)
+    next_board = _copy_board(board)
 
-    # put piece on target square
-    next_board[target], next_board[square] = next_board[square], 0
+    # put piece on target square, a moved piece loses its castling flag
+    next_board[target], next_board[square] = next_board[square]&~8, 0
 
     # handle castling
-    if castle and board[target]&7 == 7:
+    if castle and board[square]&7 == 7 and abs(target - square) == 2:
         if target == square+2: # 0-0
-            next_board[target-1], next_board[square+3] = next_board[square+3], 0
+            next_board[target-1], next_board[square+3] = next_board[square+3]&~8, 0
         else: # 0-0-0
-            next_board[target+1], next_board[square-4] = next_board[square-4], 0
-    
+            next_board[target+1], next_board[square-4] = next_board[square-4]&~8, 0
+    # handle en passant, the captured pawn sits beside the moving pawn
+    elif board[square]&7 == 2 and (target - square) % 10 and board[target] == 0:
+        next_board[square - square%10 + target%10] = 0
+
+    if board[square]&8 or board[target]&8:
+        _castling(next_board)
     return next_board
 
+def _copy_board(board):
+    # every mutable board copy of the rules is made here, so the profile
+    # counts them all
+    return bytearray(board)
+
+def _castling(board):
+    # castling flags are kept canonical so a position hashes the same however
+    # it was reached: a king keeps its flag only with a flagged rook at home
+    # and a rook only beside a flagged king. Returns the squares cleared
+    cleared = []
+    for king, rooks in ((95, (98, 91)), (25, (28, 21))):
+        flagged = [rook for rook in rooks if board[rook]&8]
+        if not board[king]&8:
+            cleared += flagged
+        elif not flagged:
+            cleared.append(king)
+    for i in cleared:
+        board[i] &= ~8
+    return cleared
+
+class _Rules:
+    # what the rules cache keeps per position, filled in as it is asked for
+    __slots__ = ('moves', 'targets', 'status')
+
+    def __init__(self, moves):
+        self.moves = tuple(moves)
+        self.targets = self.status = None
+
+def _cached(chess_board):
+    key = chess_board.key if chess_board.key is not None else zobrist(chess_board)
+    entry = _cache.probe(key)
+    if entry is None:
+        entry = _Rules(generate_moves(chess_board))
+        _cache.store(key, 0, entry)
+    return entry
+
+def _complete(board, player, en_passant, w_king, b_king):
+    # a ChessBoard with the check flag and the derived fields filled in
+    king = w_king if player else b_king
+    chess_board = ChessBoard(
+        bytes(board), player, en_passant, 0, w_king, b_king,
+        _under_attack(board, king, not player, en_passant=en_passant)
+    )
+    return chess_board._replace(
+        key=zobrist(chess_board),
+        pieces=_pieces(board),
+        signature=_signature(board)
+    )
+
+def _status(chess_board):
+    if not chess_board:
+        return 'checkmate' if chess_board.check else 'stalemate'
+    if not chess_board.material:
+        return 'insufficient material'
+    return None
+
+def _signature(board):
+    return sum(_SIGNATURE[board[i] << 7 | i] for i in _SQUARES if board[i])
+
+def _pieces(board):
+    return (frozenset(i for i in _SQUARES if 0 < board[i] < 32),
+            frozenset(i for i in _SQUARES if 32 <= board[i] < 64))
+
+def _changed(board, next_board, square, target):
+    # castling and en passant also change squares beside the two the move names,
+    # and a move can clear the castling flags at home
+    squares = {square, target, square+3, square-4, target-1, target+1, square - square%10 + target%10,
+               21, 25, 28, 91, 95, 98}
+    return [i for i in squares if board[i] != next_board[i]]
+
 def _under_attack(board, target, player, en_passant=0):
+    # look outward from the target for an attacker of the given color,
+    # en passant never captures on a square that can be attacked
+    color = 0 if player else 32
     if player:
-        attacks = (i for i in range(21, 100) if not board[i]&32 and 0 < board[i] < 255)
-    else:
-        attacks = (i for i in range(21, 100) if board[i]&32 and 0 < board[i] < 255)
-    for square in attacks:
-        moves = _move_piece(board, square, en_passant=en_passant)
-        if target in moves:
+        if board[target+9] == 2 or board[target+11] == 2:
+            return True
+    elif board[target-9] == 34 or board[target-11] == 34:
+        return True
+    knight, king, queen = color | 3, color | 7, color | 6
+    for i in _KNIGHT_TARGETS[target]:
+        if board[i] == knight:
+            return True
+    for i in _KING_TARGETS[target]:
+        if board[i]&~8 == king:
             return True
-    return False  
+    for rays, slider in ((_BISHOP_RAYS[target], color | 4), (_ROOK_RAYS[target], color | 5)):
+        for ray in rays:
+            for position in ray:
+                if board[position]:
+                    if board[position]&~8 in (slider, queen):
+                        return True
+                    break
+    return False
 
 def _move_piece(board, square, en_passant=0, castle=False):
     piece = board[square]&7
@@ -295,62 +1151,39 @@ def _move_pawn(board, square, en_passant=0):
     return frozenset(moves)
 
 def _move_knight(board, square):
-    moves = []
-    for i in [8, 12, 19, 21]:
-        if board[square+i] == 0:
-            moves.append(square+i)
-        elif board[square+i] != 255 and board[square]&32 != board[square+i]&32:
-            moves.append(square+i)
-        if board[square-i] == 0:
-            moves.append(square-i)
-        elif board[square-i] != 255 and board[square]&32 != board[square-i]&32:
-            moves.append(square-i)
-    return frozenset(moves)
+    color = board[square]&32
+    return frozenset(i for i in _KNIGHT_TARGETS[square] if board[i] == 0 or board[i]&32 != color)
 
 def _move_bishop(board, square):
-    return frozenset().union(*map(_slide, [board]*4, [square]*4, [11, -11, 9, -9]))
+    return frozenset(_slide_rays(board, square, _BISHOP_RAYS[square]))
 
 def _move_rook(board, square):
-    return frozenset().union(*map(_slide, [board]*4, [square]*4, [10, -10, 1, -1]))
+    return frozenset(_slide_rays(board, square, _ROOK_RAYS[square]))
 
 def _move_queen(board, square):
-    return _move_bishop(board, square) | _move_rook(board, square)
+    return frozenset(_slide_rays(board, square, _QUEEN_RAYS[square]))
 
 def _move_king(board, square, en_passant=0, castle=False):
-    moves = []
-    for i in [1, 9, 10, 11]:
-        if (board[square+i] == 0 or board[square+i] != 255 and
-                board[square]&32 != board[square+i]&32):
-            moves.append(square+i)
-        if (board[square-i] == 0 or board[square-i] != 255 and
-                board[square]&32 != board[square-i]&32):
-            moves.append(square-i)
+    color = board[square]&32
+    moves = [i for i in _KING_TARGETS[square] if board[i] == 0 or board[i]&32 != color]
     if castle and board[square]&8:
-        if (board[square+3]&7 == 5 and
-            0 == board[square+1] == board[square+2] and
-            not _under_attack(board, square+1, board[square]&32, en_passant=en_passant) and
-            not _under_attack(board, square+2, board[square]&32, en_passant=en_passant)):
-                moves.append(square+2)
-        if (board[square-4]&7 == 5 and
-            0 == board[square-1] == board[square-2] == board[square-3] and
-            not _under_attack(board, square-1, board[square]&32, en_passant=en_passant) and
-            not _under_attack(board, square-2, board[square]&32, en_passant=en_passant)):
-                moves.append(square-2)
+        moves += _castle_targets(board, board, square, color)
     return frozenset(moves)
 
 def _slide(board, square, direction):
-    moves = []
-    position = square + direction
-    while board[position] != 255:
-        if board[position] == 0:
-            moves.append(position)
-        elif board[square]&32 != board[position]&32:
-            moves.append(position)
-            break
-        else:
-            break
-        position += direction
-    return frozenset(moves)
+    rays = [ray for ray in _QUEEN_RAYS[square] if ray[0] == square + direction]
+    return frozenset(_slide_rays(board, square, rays))
+
+def _slide_rays(board, square, rays):
+    color = board[square]&32
+    for ray in rays:
+        for position in ray:
+            if board[position] == 0:
+                yield position
+            else:
+                if board[position]&32 != color:
+                    yield position
+                break
 
 def _i2symbol(i):
     return B_PIECES[(i&7) - 2] if i&32 else W_PIECES[(i&7) -2]
@@ -364,7 +1197,44 @@ def _an2i(an):
 def _i2an(i):
     return '%s%d' % ('abcdefgh'[i%10 - 1], 10 - i//10)
 
+def _move2an(packed):
+    promotion = packed >> 14 & 7
+    return _i2an(packed & 127) + _i2an(packed >> 7 & 127) + ('nbrq'[promotion-3] if promotion else '')
+
+# boards are immutable, every new game shares the one start position
+_START = ChessBoard.from_fen(START_FEN)
+
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='chess in the terminal')
+    parser.add_argument('--ai', type=int, choices=(1, 2), help='let the engine play as player 1 or 2')
+    parser.add_argument('--movetime', type=float, default=1.0, help='engine thinking time in seconds')
+    parser.add_argument('--book', help='Polyglot opening book for the engine')
+    parser.add_argument('--tablebase', metavar='DIRECTORY', help='endgame tables for the engine and adjudication')
+    parser.add_argument('--profile', action='store_true', help='print call counts and times of the rules on exit')
+    args = parser.parse_args()
+    if args.profile:
+        import atexit
+        enable_profile()
+
+        @atexit.register
+        def print_profile():
+            profile = stats()
+            print('\n%-14s %10s %10s %10s' % ('function', 'calls', 'seconds', 'us/call'))
+            for name in (*_PROFILED, '__bool__'):
+                calls, seconds = profile[name]['calls'], profile[name]['seconds']
+                print('%-14s %10d %10.3f %10.1f' % (name, calls, seconds, 1e6 * seconds / calls if calls else 0))
+            print(f"boards per move: {profile['boards_per_move']:.1f}")
+    if args.tablebase:
+        import tablebase
+        tables = tablebase.Tablebase(args.tablebase)
+    if args.ai:
+        import search
+        searcher = search.Searcher(tablebase=tables if args.tablebase else None)
+    if args.book:
+        import book
+        opening_book = book.Book(args.book)
+
     print('Valid moves:')
     print('xx yy    ==> xx: position of piece | yy: postion to move to')
     print('xx 0-0   ==> king side castle')
@@ -374,30 +1244,45 @@ if __name__ == '__main__':
     while True:
         if chess_board.check:
             print('check!')
-        try:
-            square, position, *_ = input(f"player {1 if chess_board.player else 2}'s turn ==> ").split()
-        except ValueError:
-            print('missing input!')
-            continue
-        try:
-            chess_board = move(chess_board, square, position)
-        except (SquareError, MoveError) as err:
-            print(err)
-            continue
-        while chess_board.promoted:
-            print(f'promote {position} to:')
-            if position[1] == '1':
-                print('1. \u265B', '2. \u265C', '3. \u265D', '4. \u265E', sep='\n')
-            else:
-                print('1. \u2655', '2. \u2656', '3. \u2657', '4. \u2658', sep='\n')
-            choice, *_ = input()
+        if args.ai == (1 if chess_board.player else 2):
+            packed = opening_book.choose(chess_board) if args.book else None
+            if packed is None:
+                packed = searcher.search(chess_board, search.Limits(movetime=args.movetime)).move
+            print(f"player {args.ai} plays {_move2an(packed)}")
+            chess_board = play_move(chess_board, packed)
+        else:
             try:
-                chess_board = promote(chess_board, choice)
-            except PromotionError as err:
+                square, position, *_ = input(f"player {1 if chess_board.player else 2}'s turn ==> ").split()
+            except ValueError:
+                print('missing input!')
+                continue
+            try:
+                chess_board = move(chess_board, square, position)
+            except (SquareError, MoveError) as err:
                 print(err)
+                continue
+            while chess_board.promoted:
+                print(f'promote {position} to:')
+                if position[1] == '1':
+                    print('1. \u265B', '2. \u265C', '3. \u265D', '4. \u265E', sep='\n')
+                else:
+                    print('1. \u2655', '2. \u2656', '3. \u2657', '4. \u2658', sep='\n')
+                choice, *_ = input() or '0'
+                try:
+                    chess_board = promote(chess_board, int(choice) if choice.isdigit() else 0)
+                except PromotionError as err:
+                    print(err)
         print(chess_board)
         if not chess_board.material:
             print('draw: insufficient material!')
+        if args.tablebase and chess_board:
+            result = tables.probe(chess_board)
+            if result is not None and result.wdl == 0:
+                print('draw: tablebase!')
+                break
+            if result is not None:
+                winner = 1 if chess_board.player == (result.wdl > 0) else 2
+                print(f'tablebase: player {winner} mates in {(result.dtm + 1) // 2}')
         if not chess_board:
             if chess_board.check:
                 print(f'checkmate: player {chess_board.player} won!')
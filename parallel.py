@@ -0,0 +1,101 @@
+import collections
+import itertools
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import search
+
+class Pool:
+    """Splits the root moves of a position across worker processes. Workers
+    are started once and keep a Searcher between calls, positions travel as
+    the raw board bytes and flags of a ChessBoard."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count()
+        self._executor = ProcessPoolExecutor(self.workers, initializer=_init)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown()
+
+    def perft(self, chess_board, depth):
+        if depth == 0:
+            return 1
+        return sum(self.divide(chess_board, depth).values())
+
+    def divide(self, chess_board, depth):
+        moves = chess.generate_moves(chess_board)
+        if depth <= 1:
+            return {chess._move2an(packed): 1 for packed in moves}
+        fields = chess_board[:7]
+        nodes = self._executor.map(_perft, [fields] * len(moves), moves, [depth - 1] * len(moves))
+        return dict(zip(map(chess._move2an, moves), nodes))
+
+    def search(self, chess_board, limits=search.Limits()):
+        # every worker searches its share of the root moves under the same
+        # limits, the line with the best score wins
+        moves = chess.generate_moves(chess_board)
+        if len(moves) < 2:
+            return search.search(chess_board, limits)
+        start = time.perf_counter()
+        shares = [tuple(moves[i::self.workers]) for i in range(min(self.workers, len(moves)))]
+        fields = chess_board[:7]
+        results = list(self._executor.map(_search, [fields] * len(shares), [limits] * len(shares), shares))
+        best = max(results, key=lambda result: result.score)
+        return best._replace(
+            depth=min(result.depth for result in results),
+            nodes=sum(result.nodes for result in results),
+            seconds=time.perf_counter() - start
+        )
+
+    def replay(self, games, batch=64):
+        # games are read lazily and sent in batches, at most two batches per
+        # worker are in flight and the replays come back in game order
+        return self._batches(_replay, games, batch)
+
+    def selfplay(self, seeds, batch=16, **options):
+        # a selfplay.play game per seed, batched like replay
+        return self._batches(_selfplay, seeds, batch, options)
+
+    def _batches(self, function, items, batch, *args):
+        items = iter(items)
+        pending = collections.deque()
+        while True:
+            while len(pending) < 2 * self.workers:
+                items_batch = list(itertools.islice(items, batch))
+                if not items_batch:
+                    break
+                pending.append(self._executor.submit(function, items_batch, *args))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+
+_searcher = None
+
+def _init():
+    global _searcher
+    _searcher = search.Searcher()
+
+def _perft(fields, packed, depth):
+    position = chess.Position(chess.ChessBoard(*fields))
+    position.make(packed)
+    return position.perft(depth)
+
+def _replay(games):
+    import pgn
+    return [pgn.replay(game) for game in games]
+
+def _selfplay(seeds, options):
+    import selfplay
+    return [selfplay.play(seed, **options) for seed in seeds]
+
+def _search(fields, limits, moves):
+    return _searcher.search(chess.ChessBoard(*fields), limits._replace(moves=moves))
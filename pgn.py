@@ -0,0 +1,140 @@
+import argparse
+import json
+import re
+import sys
+
+from typing import NamedTuple
+
+import chess
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+_HEADER = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]$')
+_TOKEN = re.compile(r'[{}();]|\$\d+|\d+\.+|[^\s{}();]+')
+_MOVE_NUMBER = re.compile(r'^\d+\.+$')
+
+class Game(NamedTuple):
+    headers: dict
+    moves: tuple # SAN
+    result: str # the movetext termination marker, or the Result tag without one
+
+class Replay(NamedTuple):
+    headers: dict
+    result: str
+    legal: bool
+    plies: int # moves played before the first illegal one
+    fen: str # final position
+    error: str = None
+    moves: tuple = () # packed, the legal ones
+
+def read_games(lines):
+    # yields every game of a PGN text given line by line, comments,
+    # variations and NAGs are dropped and only one game is held in memory
+    headers, moves = {}, []
+    comment, variations = False, 0
+    for line in lines:
+        if comment:
+            end = line.find('}')
+            if end < 0:
+                continue
+            line, comment = line[end+1:], False
+        stripped = line.strip()
+        if not stripped or stripped.startswith('%'):
+            continue
+        if stripped.startswith('[') and not variations:
+            m = _HEADER.match(stripped)
+            if m:
+                if moves:
+                    yield Game(headers, tuple(moves), headers.get('Result', '*'))
+                    headers, moves = {}, []
+                headers[m[1]] = m[2].replace('\\"', '"').replace('\\\\', '\\')
+                continue
+        for token in _TOKEN.findall(line):
+            if comment:
+                comment = token != '}'
+            elif token == '{':
+                comment = True
+            elif token == ';':
+                break
+            elif token == '(':
+                variations += 1
+            elif token == ')':
+                variations = max(variations - 1, 0)
+            elif variations or token[0] == '$' or _MOVE_NUMBER.match(token):
+                continue
+            elif token in RESULTS:
+                yield Game(headers, tuple(moves), token)
+                headers, moves = {}, []
+            else:
+                moves.append(token)
+    if headers or moves:
+        yield Game(headers, tuple(moves), headers.get('Result', '*'))
+
+def replay(game):
+    # plays the game through move() and promote() from the start position or
+    # its FEN tag, stopping at the first move the rules reject
+    moves = []
+    try:
+        fen = game.headers.get('FEN')
+        chess_board = chess.ChessBoard.from_fen(fen) if fen else chess.new_game()
+    except chess.FenError as e:
+        return Replay(game.headers, game.result, False, 0, fen, str(e))
+    # move numbers count on from the FEN's fullmove field and side to move
+    fields = fen.split() if fen else ()
+    fullmove = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+    black = not chess_board.player
+    for san in game.moves:
+        try:
+            packed = chess.parse_san(chess_board, san)
+            chess_board = chess.play_move(chess_board, packed)
+        except (chess.MoveError, chess.SquareError, chess.PromotionError) as e:
+            ply = len(moves) + black
+            number = f'{fullmove + ply//2}...' if ply % 2 else f'{fullmove + ply//2}.'
+            return Replay(game.headers, game.result, False, len(moves), chess_board.to_fen(),
+                          f'{number} {e}', tuple(moves))
+        moves.append(packed)
+    return Replay(game.headers, game.result, True, len(moves), chess_board.to_fen(), None, tuple(moves))
+
+def replay_games(games, workers=1):
+    # replays in order, across worker processes when there is more than one
+    if workers == 1:
+        yield from map(replay, games)
+        return
+    import parallel
+    with parallel.Pool(workers) as pool:
+        yield from pool.replay(games)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='replay the games of a PGN file through the rules')
+    parser.add_argument('file', help='PGN file, - for standard input')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='replay across this many processes')
+    parser.add_argument('--json', action='store_true', help='print one JSON object per game')
+    args = parser.parse_args(argv)
+
+    f = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8', errors='replace')
+    games = illegal = 0
+    with f:
+        for n, r in enumerate(replay_games(read_games(f), args.workers), 1):
+            games += 1
+            illegal += not r.legal
+            if args.json:
+                print(json.dumps({
+                    'game': n,
+                    'white': r.headers.get('White'),
+                    'black': r.headers.get('Black'),
+                    'result': r.result,
+                    'legal': r.legal,
+                    'plies': r.plies,
+                    'fen': r.fen,
+                    'error': r.error
+                }))
+            else:
+                print('%6d %-7s %-7s %4d %s%s' % (
+                    n, r.result, 'ok' if r.legal else 'ILLEGAL', r.plies, r.fen,
+                    f'  ({r.error})' if r.error else ''))
+    if not args.json:
+        print(f'{games} games, {illegal} illegal')
+    return 0 if not illegal else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import argparse
+import mmap
+import struct
+import sys
+
+from array import array
+
+import chess
+import pgn
+
+# a game record file:
+#   header  MAGIC, snapshot interval
+#   games   result, flags, plies, snapshots, one 16 bit move per ply
+#   index   the offset of every game
+#   footer  index offset, number of games, MAGIC
+# a move is from square | to square << 7 | promotion piece - 3 << 14 in the
+# 10x12 numbering, castling, en passant and whether a move promotes at all
+# follow from the board. A snapshot holds the 64 square bytes, en passant and
+# the player, one is stored every interval plies and at ply 0 when the game
+# does not start from the start position. Numbers are little endian.
+MAGIC = b'CGR1'
+_HEADER = struct.Struct('<4sH10x')
+_GAME = struct.Struct('<BBI')
+_FOOTER = struct.Struct('<QQ4s4x')
+SNAPSHOT_BYTES = 66
+
+_START_SNAPSHOT = 1 # flags
+
+class GameWriter:
+    """Appends games to a new record file, the index is written on close."""
+
+    def __init__(self, filename, interval=64):
+        self.interval = interval
+        self._f = open(filename, 'wb')
+        self._f.write(_HEADER.pack(MAGIC, interval))
+        self._offsets = array('Q')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def add(self, moves, start=None, result='*'):
+        # moves are packed, see chess.generate_moves, and are not validated
+        position = chess.Position(start or chess.new_game())
+        flags = _START_SNAPSHOT if start is not None and start.key != chess.new_game().key else 0
+        snapshots = [_snapshot(position)] if flags & _START_SNAPSHOT else []
+        codes = array('H')
+        for ply, packed in enumerate(moves, 1):
+            codes.append(_pack(packed))
+            position.make(packed)
+            if self.interval and ply % self.interval == 0:
+                snapshots.append(_snapshot(position))
+        if sys.byteorder == 'big':
+            codes.byteswap()
+        self._offsets.append(self._f.tell())
+        self._f.write(_GAME.pack(pgn.RESULTS.index(result), flags, len(codes)))
+        self._f.write(b''.join(snapshots))
+        self._f.write(codes.tobytes())
+        return len(self._offsets) - 1
+
+    def close(self):
+        if self._f.closed:
+            return
+        index = self._f.tell()
+        offsets = array('Q', self._offsets)
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        self._f.write(offsets.tobytes())
+        self._f.write(_FOOTER.pack(index, len(offsets), MAGIC))
+        self._f.close()
+
+class GameFile:
+    """Memory mapped record file, games are found through the index and
+    positions are rebuilt from the nearest snapshot on request."""
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.interval = _HEADER.unpack_from(self._mm)
+        self._index, self._count, footer = _FOOTER.unpack_from(self._mm, len(self._mm) - _FOOTER.size)
+        if magic != MAGIC or footer != MAGIC:
+            raise ValueError(f'{filename} is not a game record file!')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if not -self._count <= i < self._count:
+            raise IndexError('game index out of range')
+        offset, = struct.unpack_from('<Q', self._mm, self._index + 8 * (i % self._count))
+        return GameRecord(self, offset)
+
+    def __iter__(self):
+        return (self[i] for i in range(self._count))
+
+    def close(self):
+        self._mm.close()
+
+class GameRecord:
+    __slots__ = ('result', 'plies', '_file', '_flags', '_snapshots', '_moves')
+
+    def __init__(self, game_file, offset):
+        result, self._flags, self.plies = _GAME.unpack_from(game_file._mm, offset)
+        self.result = pgn.RESULTS[result]
+        self._file = game_file
+        self._snapshots = offset + _GAME.size
+        count = (self.plies // game_file.interval if game_file.interval else 0) + (self._flags & _START_SNAPSHOT)
+        self._moves = self._snapshots + count * SNAPSHOT_BYTES
+
+    def __len__(self):
+        return self.plies
+
+    @property
+    def codes(self):
+        # the 16 bit moves as stored
+        return struct.unpack_from(f'<{self.plies}H', self._file._mm, self._moves)
+
+    def position(self, ply):
+        # the board after the given number of plies, negative counts from the end
+        if ply < 0:
+            ply += self.plies + 1
+        if not 0 <= ply <= self.plies:
+            raise IndexError('ply out of range')
+        interval = self._file.interval
+        base = ply // interval * interval if interval else 0
+        position = chess.Position(self._snapshot(base))
+        for code in struct.unpack_from(f'<{ply - base}H', self._file._mm, self._moves + 2 * base):
+            position.make(_unpack(position.board, code))
+        return position.to_board()
+
+    def moves(self):
+        # packed moves, castling and en passant flags restored from the boards
+        position = chess.Position(self._snapshot(0))
+        moves = []
+        for code in self.codes:
+            moves.append(_unpack(position.board, code))
+            position.make(moves[-1])
+        return moves
+
+    def positions(self):
+        # every board from the start to the final position
+        position = chess.Position(self._snapshot(0))
+        yield position.to_board()
+        for code in self.codes:
+            position.make(_unpack(position.board, code))
+            yield position.to_board()
+
+    def _snapshot(self, ply):
+        start = self._flags & _START_SNAPSHOT
+        if ply == 0 and not start:
+            return chess.new_game()
+        i = (ply // self._file.interval if ply else 0) - 1 + start
+        return _restore(self._file._mm, self._snapshots + i * SNAPSHOT_BYTES)
+
+def _pack(packed):
+    promotion = packed >> 14 & 7
+    return packed & 0x3fff | (promotion - 3 if promotion else 0) << 14
+
+def _unpack(board, code):
+    square, target = code & 127, code >> 7 & 127
+    piece = board[square]&7
+    packed = code & 0x3fff
+    if piece == 2:
+        if target // 10 in (2, 9):
+            packed |= (code >> 14) + 3 << 14
+        elif (target - square) % 10 and not board[target]:
+            packed |= chess.EN_PASSANT
+    elif piece == 7 and abs(target - square) == 2:
+        packed |= chess.CASTLE
+    return packed
+
+def _snapshot(position):
+    board = position.board
+    return bytes([*(board[i] for i in chess._SQUARES), position.en_passant, position.player])
+
+def _restore(data, offset):
+    board = bytearray(chess._EMPTY_BOARD)
+    kings = {}
+    for i, square in enumerate(chess._SQUARES):
+        piece = board[square] = data[offset + i]
+        if piece&~8 in (7, 39):
+            kings[piece&~8] = square
+    return chess._complete(board, bool(data[offset + 65]), data[offset + 64], kings[7], kings[39])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='pack the legal games of a PGN file into a game record file')
+    parser.add_argument('pgn', help='PGN file, - for standard input')
+    parser.add_argument('output', help='game record file to write')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='replay across this many processes')
+    parser.add_argument('--interval', type=int, default=64, help='plies between snapshots, 0 for none (default: 64)')
+    args = parser.parse_args(argv)
+
+    f = sys.stdin if args.pgn == '-' else open(args.pgn, encoding='utf-8', errors='replace')
+    illegal = 0
+    with f, GameWriter(args.output, args.interval) as writer:
+        for r in pgn.replay_games(pgn.read_games(f), args.workers):
+            if not r.legal:
+                illegal += 1
+                continue
+            fen = r.headers.get('FEN')
+            result = r.result if r.result in pgn.RESULTS else '*'
+            writer.add(r.moves, chess.ChessBoard.from_fen(fen) if fen else None, result)
+    print(f'{len(writer)} games written, {illegal} illegal games skipped')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
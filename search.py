@@ -0,0 +1,302 @@
+import time
+
+from typing import NamedTuple
+
+import chess
+
+MATE = 100000
+INFINITY = MATE + 1
+MAX_PLY = 128
+
+# piece values and piece-square tables from white's side, rank 8 first
+VALUES = (0, 0, 100, 320, 330, 500, 900, 0)
+PST = {
+    2: (0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0),
+    3: (-50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50),
+    4: (-20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20),
+    5: (0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0),
+    6: (-20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20),
+    7: (-30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20)
+}
+SQUARES = tuple(row*10 + col for row in range(2, 10) for col in range(1, 9))
+
+# score of every piece byte on every square, positive for white
+_SCORES = [0] * (64 << 7)
+for _piece, _table in PST.items():
+    for _i, _square in enumerate(SQUARES):
+        _mirror = (7 - _i//8) * 8 + _i % 8
+        for _flag in (0, 8):
+            _SCORES[(_piece | _flag) << 7 | _square] = VALUES[_piece] + _table[_i]
+            _SCORES[(32 | _piece | _flag) << 7 | _square] = -VALUES[_piece] - _table[_mirror]
+del _piece, _table, _i, _square, _mirror, _flag
+
+class Limits(NamedTuple):
+    depth: int = None
+    movetime: float = None # seconds
+    nodes: int = None
+    moves: tuple = None # packed root moves to restrict the search to
+
+class SearchResult(NamedTuple):
+    move: int # packed, see chess.generate_moves
+    score: int # centipawns for the player to move
+    depth: int
+    nodes: int
+    seconds: float
+    pv: tuple
+
+    @property
+    def nps(self):
+        return round(self.nodes / self.seconds) if self.seconds else 0
+
+    @property
+    def mate(self):
+        # moves to mate, negative when getting mated, None when no mate was found
+        if abs(self.score) < MATE - MAX_PLY:
+            return None
+        plies = MATE - abs(self.score)
+        return (plies + 1) // 2 if self.score > 0 else -(plies // 2)
+
+class SearchStopped(Exception): pass
+
+def evaluate(position):
+    board = position.board
+    score = 0
+    for square in SQUARES:
+        if board[square]:
+            score += _SCORES[board[square] << 7 | square]
+    return score if position.player else -score
+
+def search(chess_board, limits=Limits(), info=None):
+    return Searcher().search(chess_board, limits, info)
+
+class Searcher:
+    """Iterative deepening principal variation search. The transposition
+    table, killer and history tables are kept between calls, positions a
+    tablebase covers are scored by it below the root."""
+
+    def __init__(self, max_bytes=16 << 20, tablebase=None):
+        self.table = chess.TranspositionTable(max_bytes, entry_bytes=128)
+        self.tablebase = tablebase
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = {}
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def clear(self):
+        self.table.clear()
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history.clear()
+
+    def search(self, chess_board, limits=Limits(), info=None):
+        # stop() may come from another thread, even before the search starts,
+        # the flag is cleared when the search returns
+        try:
+            return self._iterate(chess_board, limits, info)
+        finally:
+            self.stopped = False
+
+    def _iterate(self, chess_board, limits, info):
+        if chess_board.promoted:
+            raise chess.PromotionError('pending promotion!')
+        self.nodes = 0
+        self._start = time.perf_counter()
+        self._deadline = self._start + limits.movetime if limits.movetime is not None else None
+        self._max_nodes = limits.nodes
+        self.table.new_generation()
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+        for key in self.history:
+            self.history[key] //= 8
+
+        position = chess.Position(chess_board)
+        moves = chess.generate_moves(position)
+        if not moves:
+            return SearchResult(0, -MATE if position.check else 0, 0, 0, 0.0, ())
+        if limits.moves is not None:
+            moves = [packed for packed in moves if packed in limits.moves] or moves
+        self._root = moves
+        result = SearchResult(moves[0], 0, 0, 0, 0.0, (moves[0],))
+        # depth 0 still searches one ply so there is a move to return
+        last = 100 if limits.depth is None else max(limits.depth, 1)
+        for depth in range(1, last + 1):
+            self._pv = [[] for _ in range(MAX_PLY + 1)]
+            try:
+                score = self._search(position, depth, -INFINITY, INFINITY, 0)
+            except SearchStopped:
+                break
+            result = SearchResult(
+                self._pv[0][0], score, depth, self.nodes,
+                time.perf_counter() - self._start, tuple(self._pv[0])
+            )
+            if info is not None:
+                info(result)
+            if abs(score) >= MATE - depth or len(moves) == 1 and limits.depth is None:
+                break
+        return result._replace(nodes=self.nodes, seconds=time.perf_counter() - self._start)
+
+    def _tick(self):
+        self.nodes += 1
+        if self.stopped or self.nodes & 1023 == 0 or self._max_nodes is not None:
+            if (self.stopped or
+                    self._max_nodes is not None and self.nodes >= self._max_nodes or
+                    self._deadline is not None and time.perf_counter() >= self._deadline):
+                self.stopped = True
+                raise SearchStopped
+
+    def _search(self, position, depth, alpha, beta, ply):
+        self._tick()
+        self._pv[ply] = []
+        if ply and position.repetitions():
+            return 0
+        # tables cover up to 4 pieces
+        if ply and self.tablebase is not None and len(position.pieces[0]) + len(position.pieces[1]) <= 4:
+            result = self.tablebase.probe(position)
+            if result is not None:
+                return (MATE - ply - result.dtm) * result.wdl
+        if ply >= MAX_PLY:
+            return evaluate(position)
+        if depth <= 0 and not position.check:
+            return self._quiesce(position, alpha, beta, ply)
+
+        entry = self.table.probe(position.key)
+        best = 0
+        if entry is not None:
+            score, entry_depth, bound, best = entry
+            # mate scores are stored relative to the node, not the root
+            if score >= MATE - MAX_PLY:
+                score -= ply
+            elif score <= -MATE + MAX_PLY:
+                score += ply
+            if ply and entry_depth >= depth:
+                if bound == 0 or bound > 0 and score >= beta or bound < 0 and score <= alpha:
+                    return score
+
+        moves = chess.generate_moves(position) if ply else self._root
+        if not moves:
+            return -MATE + ply if position.check else 0
+        if depth <= 0:
+            depth = 1 # check extension at the horizon
+
+        alpha_start = alpha
+        best_score = -INFINITY
+        for i, packed in enumerate(self._order(position, moves, best, ply)):
+            position.make(packed)
+            if i == 0:
+                score = -self._search(position, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                score = -self._search(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._search(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake()
+            if score > best_score:
+                best_score, best = score, packed
+                if score > alpha:
+                    alpha = score
+                    self._pv[ply] = [packed] + self._pv[ply + 1]
+                    if score >= beta:
+                        if not self._capture(position, packed):
+                            killers = self.killers[ply]
+                            if killers[0] != packed:
+                                killers[0], killers[1] = packed, killers[0]
+                            key = packed & 0x3fff
+                            self.history[key] = self.history.get(key, 0) + depth * depth
+                        break
+
+        bound = 1 if best_score >= beta else -1 if best_score <= alpha_start else 0
+        score = best_score
+        if score >= MATE - MAX_PLY:
+            score += ply
+        elif score <= -MATE + MAX_PLY:
+            score -= ply
+        self.table.store(position.key, depth, (score, depth, bound, best))
+        return best_score
+
+    def _quiesce(self, position, alpha, beta, ply):
+        self._pv[ply] = []
+        stand_pat = evaluate(position)
+        if ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        captures = list(chess.iter_moves(position, quiet=False))
+        for packed in self._order(position, captures, 0, ply):
+            self._tick()
+            position.make(packed)
+            score = -self._quiesce(position, -beta, -alpha, ply + 1)
+            position.unmake()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+                self._pv[ply] = [packed] + self._pv[ply + 1]
+        return alpha
+
+    @staticmethod
+    def _capture(position, packed):
+        return position.board[packed >> 7 & 127] or packed & (chess.EN_PASSANT | 0x1c000)
+
+    def _order(self, position, moves, best, ply):
+        # hash move, then captures by MVV-LVA and promotions, killers, history
+        board = position.board
+        killers = self.killers[ply] if ply < len(self.killers) else (0, 0)
+        history = self.history
+
+        def score(packed):
+            if packed == best:
+                return 1 << 30
+            victim = board[packed >> 7 & 127]
+            if victim or packed & (chess.EN_PASSANT | 0x1c000):
+                return (1 << 28) + VALUES[victim&7 or 2] * 16 - VALUES[board[packed & 127]&7] // 10 + \
+                    VALUES[packed >> 14 & 7]
+            if packed == killers[0]:
+                return 1 << 27
+            if packed == killers[1]:
+                return (1 << 27) - 1
+            return history.get(packed & 0x3fff, 0)
+
+        return sorted(moves, key=score, reverse=True)
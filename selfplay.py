@@ -0,0 +1,119 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+from collections import Counter
+from typing import NamedTuple
+
+import chess
+import record
+import search
+
+POLICIES = ('random', 'weighted')
+
+class SelfPlay(NamedTuple):
+    seed: int
+    moves: tuple # packed, see chess.generate_moves
+    result: str
+    termination: str
+    positions: tuple = () # sampled boards, see ChessBoard.to_bytes
+
+def play(seed, policy='random', max_plies=400, sample=0.0):
+    # one game from the start position, the same seed plays the same game.
+    # The weighted policy favours captures and promotions by the value won,
+    # a game still going after max_plies ends unfinished. Sampling draws on
+    # its own generator so it does not change the moves
+    rng, sampler = random.Random(seed), random.Random(f'sample {seed}')
+    chess_board = chess.new_game()
+    keys = Counter([chess_board.key])
+    quiet = 0 # plies since the last capture or pawn move
+    moves = []
+    positions = []
+    while True:
+        if not chess_board:
+            if chess_board.check:
+                result, termination = '0-1' if chess_board.player else '1-0', 'checkmate'
+            else:
+                result, termination = '1/2-1/2', 'stalemate'
+            break
+        if not chess_board.material:
+            result, termination = '1/2-1/2', 'insufficient material'
+            break
+        if keys[chess_board.key] >= 3:
+            result, termination = '1/2-1/2', 'threefold repetition'
+            break
+        if quiet >= 100:
+            result, termination = '1/2-1/2', 'fifty moves'
+            break
+        if len(moves) >= max_plies:
+            result, termination = '*', 'max plies'
+            break
+        candidates = chess.generate_moves(chess_board)
+        board = chess_board.board
+        if policy == 'weighted':
+            packed = rng.choices(candidates, [
+                100 + search.VALUES[board[m >> 7 & 127]&7 or (2 if m & chess.EN_PASSANT else 0)] +
+                search.VALUES[m >> 14 & 7] for m in candidates
+            ])[0]
+        else:
+            packed = rng.choice(candidates)
+        quiet = 0 if board[packed & 127]&7 == 2 or board[packed >> 7 & 127] else quiet + 1
+        chess_board = chess.play_move(chess_board, packed)
+        keys[chess_board.key] += 1
+        moves.append(packed)
+        if sample and sampler.random() < sample:
+            positions.append(chess_board.to_bytes())
+    return SelfPlay(seed, tuple(moves), result, termination, tuple(positions))
+
+def play_games(count, seed=0, workers=1, **options):
+    # game i is played from seed + i, in order and the same for any number
+    # of workers, see play for the options
+    seeds = range(seed, seed + count)
+    if workers == 1:
+        yield from (play(seed, **options) for seed in seeds)
+        return
+    import parallel
+    with parallel.Pool(workers) as pool:
+        yield from pool.selfplay(seeds, **options)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='play random games against itself into a game record file')
+    parser.add_argument('output', help='game record file to write')
+    parser.add_argument('-n', '--games', type=int, default=100, help='number of games (default: 100)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game (default: 0)')
+    parser.add_argument('--policy', choices=POLICIES, default='random', help='move choice (default: random)')
+    parser.add_argument('--max-plies', type=int, default=400, help='unfinished after this many plies (default: 400)')
+    parser.add_argument('--positions', metavar='FILE', help='also write sampled positions, see store.PositionStore')
+    parser.add_argument('--sample', type=float, default=0.1, help='share of positions sampled (default: 0.1)')
+    args = parser.parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+
+    options = dict(policy=args.policy, max_plies=args.max_plies, sample=args.sample if args.positions else 0.0)
+    results = Counter()
+    plies = sampled = 0
+    start = time.perf_counter()
+    positions = open(args.positions, 'wb') if args.positions else None
+    try:
+        with record.GameWriter(args.output) as writer:
+            for game in play_games(args.games, args.seed, workers, **options):
+                writer.add(game.moves, result=game.result)
+                results[game.termination] += 1
+                plies += len(game.moves)
+                if positions is not None:
+                    positions.write(b''.join(game.positions))
+                    sampled += len(game.positions)
+    finally:
+        if positions is not None:
+            positions.close()
+    seconds = time.perf_counter() - start
+    print(f'{args.games} games, {plies} plies, {sampled} positions in {seconds:.1f}s '
+          f'({args.games / seconds if seconds else 0:.1f} games/s on {workers} workers)')
+    for termination, count in results.most_common():
+        print('%-22s %6d' % (termination, count))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
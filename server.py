@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+
+from collections import Counter
+
+import chess
+
+# one JSON object per line each way, replies come in the order of the requests:
+#   {"op": "new", "fen": ...}                   a game, from the start position
+#                                               when there is no fen
+#   {"op": "move", "game": 1, "move": "e2e4"}   e7e8q promotes at once, e7e8
+#                                               leaves the promotion pending
+#   {"op": "promote", "game": 1, "piece": "q"}
+#   {"op": "state", "game": 1}
+#   {"op": "close", "game": 1}
+#   {"op": "stats"}
+# games answer with their state: id, fen, player, check, the square of a
+# pending promotion, plies, status, result and latency. The status is
+# checkmate, stalemate, insufficient material, threefold repetition, fifty
+# moves or null, all but checkmate are draws.
+# An "id" in a request is echoed, failures answer {"error": message}.
+_MOVE = re.compile(r'[a-h][1-8][a-h][1-8][qrbn]?')
+_PROMOTIONS = {'q': 1, 'r': 2, 'b': 3, 'n': 4}
+
+class RequestError(Exception): pass
+
+class Game:
+    __slots__ = ('id', 'chess_board', 'plies', 'quiet', 'keys', 'requests', 'latency', 'max_latency')
+
+    def __init__(self, game_id, chess_board):
+        self.id = game_id
+        self.chess_board = chess_board
+        self.plies = 0
+        self.quiet = 0 # plies since the last capture or pawn move
+        self.keys = Counter([chess_board.key])
+        self.requests = 0
+        self.latency = self.max_latency = 0.0
+
+    def move(self, an):
+        if not _MOVE.fullmatch(an):
+            raise chess.MoveError(f'{an} invalid move!')
+        board = self.chess_board.board
+        s, target = chess._an2i(an[:2]), chess._an2i(an[2:4])
+        position = an[2:4]
+        if board[s]&7 == 7 and abs(target - s) == 2:
+            position = '0-0' if target > s else '0-0-0'
+        chess_board = chess.move(self.chess_board, an[:2], position)
+        if an[4:] and not chess_board.promoted:
+            raise chess.PromotionError(f'{an} does not promote!')
+        if an[4:]:
+            chess_board = chess.promote(chess_board, _PROMOTIONS[an[4]])
+        self.quiet = 0 if board[s]&7 == 2 or board[target] and not position.startswith('0') else self.quiet + 1
+        self.plies += 1
+        self._advance(chess_board)
+
+    def promote(self, piece):
+        if piece not in _PROMOTIONS:
+            raise chess.PromotionError('invalid promotion!')
+        self._advance(chess.promote(self.chess_board, _PROMOTIONS[piece]))
+
+    def status(self):
+        chess_board = self.chess_board
+        if chess_board.promoted:
+            return None
+        result = chess.status(chess_board)
+        if result is None and self.keys[chess_board.key] >= 3:
+            result = 'threefold repetition'
+        if result is None and self.quiet >= 100:
+            result = 'fifty moves'
+        return result
+
+    def state(self):
+        chess_board = self.chess_board
+        status = self.status()
+        return {
+            'game': self.id,
+            'fen': chess_board.to_fen(),
+            'player': 'w' if chess_board.player else 'b',
+            'check': chess_board.check,
+            'promotion': chess._i2an(chess_board.promoted) if chess_board.promoted else None,
+            'plies': self.plies,
+            'status': status,
+            'result': None if status is None else '1/2-1/2' if status != 'checkmate' else '0-1' if chess_board.player else '1-0',
+            'latency': self.metrics()
+        }
+
+    def metrics(self):
+        return {
+            'requests': self.requests,
+            'mean_ms': round(1000 * self.latency / self.requests, 3) if self.requests else 0.0,
+            'max_ms': round(1000 * self.max_latency, 3)
+        }
+
+    def _advance(self, chess_board):
+        self.chess_board = chess_board
+        # positions repeat once the promotion is made
+        if not chess_board.promoted:
+            self.keys[chess_board.key] += 1
+
+class GameServer:
+    """Games kept in memory and advanced on the event loop, no thread per
+    game. Requests of all connections go through one queue and are handled
+    in batches of up to batch, the time from arrival to reply is kept per
+    game."""
+
+    def __init__(self, batch=256):
+        self.batch = batch
+        self.games = {}
+        self.requests = 0
+        self.batches = 0
+        self._next_id = 1
+        self._queue = asyncio.Queue(4 * batch)
+
+    async def submit(self, request):
+        # a future for the reply, waits while the queue is full
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((request, future, time.perf_counter()))
+        return future
+
+    async def run(self):
+        # the batch loop, runs until cancelled
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self.batches += 1
+            for request, future, arrived in batch:
+                try:
+                    reply = self.handle(request)
+                    game = self.games.get(reply.get('game'))
+                except Exception as e:
+                    # a bug in one request must not stop the loop for everyone
+                    reply, game = {'error': f'internal error: {e!r}'}, None
+                    if isinstance(request, dict) and 'id' in request:
+                        reply['id'] = request['id']
+                if game is not None:
+                    latency = time.perf_counter() - arrived
+                    game.requests += 1
+                    game.latency += latency
+                    game.max_latency = max(game.max_latency, latency)
+                    if 'latency' in reply:
+                        reply['latency'] = game.metrics()
+                if not future.cancelled():
+                    future.set_result(reply)
+            # let the connections read and write between batches
+            await asyncio.sleep(0)
+
+    def handle(self, request):
+        self.requests += 1
+        try:
+            if isinstance(request, ValueError):
+                raise RequestError(f'invalid JSON: {request}')
+            if not isinstance(request, dict):
+                raise RequestError('a request is a JSON object')
+            reply = self._handle(request.get('op'), request)
+        except (RequestError, chess.MoveError, chess.SquareError, chess.PromotionError, chess.FenError) as e:
+            reply = {'error': str(e)}
+            if isinstance(request, dict) and _game_id(request) in self.games:
+                reply['game'] = request['game']
+        if isinstance(request, dict) and 'id' in request:
+            reply['id'] = request['id']
+        return reply
+
+    def stats(self):
+        games = self.games.values()
+        requests = sum(game.requests for game in games)
+        return {
+            'games': len(self.games),
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch': round(self.requests / self.batches, 1) if self.batches else 0.0,
+            'mean_ms': round(1000 * sum(game.latency for game in games) / requests, 3) if requests else 0.0,
+            'max_ms': round(1000 * max((game.max_latency for game in games), default=0.0), 3)
+        }
+
+    async def session(self, reader, write, drain=None):
+        # serves one stream of requests until it ends, replies are written
+        # in order as they are ready
+        replies = asyncio.Queue()
+
+        async def writer():
+            while (future := await replies.get()) is not None:
+                write(json.dumps(await future))
+                if drain is not None:
+                    await drain()
+
+        writing = asyncio.ensure_future(writer())
+        try:
+            async for line in reader:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    request = e
+                replies.put_nowait(await self.submit(request))
+        finally:
+            replies.put_nowait(None)
+            await writing
+
+    async def connection(self, reader, writer):
+        def write(line):
+            writer.write(line.encode() + b'\n')
+        try:
+            await self.session(reader, write, writer.drain)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _handle(self, op, request):
+        if op == 'new':
+            fen = _field(request, 'fen', str, None)
+            game = Game(self._next_id, chess.ChessBoard.from_fen(fen) if fen else chess.new_game())
+            self.games[game.id] = game
+            self._next_id += 1
+            return game.state()
+        if op == 'stats':
+            return self.stats()
+        if op not in ('move', 'promote', 'state', 'close'):
+            raise RequestError(f'unknown op: {op}')
+        game = self.games.get(_game_id(request))
+        if game is None:
+            raise RequestError(f'unknown game: {request.get("game")}')
+        if op == 'close':
+            del self.games[game.id]
+            return {'game': game.id, 'closed': True}
+        if game.status() is not None and op != 'state':
+            raise RequestError(f'game {game.id} is over: {game.status()}')
+        if op == 'move':
+            game.move(_field(request, 'move', str, ''))
+        elif op == 'promote':
+            game.promote(_field(request, 'piece', str, ''))
+        return game.state()
+
+def _field(request, name, kind, default):
+    value = request.get(name)
+    if value is None:
+        return default
+    if not isinstance(value, kind):
+        raise RequestError(f'{name} must be a {kind.__name__}, not {type(value).__name__}')
+    return value
+
+def _game_id(request):
+    # None for anything but an integer, JSON lists and objects are unhashable
+    game = request.get('game')
+    return game if isinstance(game, int) and not isinstance(game, bool) else None
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description='serve many chess games over a line based JSON protocol')
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument('--port', type=int, help='listen on this TCP port of --host')
+    where.add_argument('--unix', metavar='PATH', help='listen on a unix socket')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP address (default: 127.0.0.1)')
+    parser.add_argument('--batch', type=int, default=256, help='requests handled per batch (default: 256)')
+    parser.add_argument('--cache', type=int, default=0, metavar='MB', help='share move generation across games')
+    args = parser.parse_args(argv)
+    if args.cache:
+        chess.enable_cache(args.cache << 20)
+
+    server = GameServer(args.batch)
+    runner = asyncio.ensure_future(server.run())
+    try:
+        if args.port is not None or args.unix:
+            if args.unix:
+                listener = await asyncio.start_unix_server(server.connection, args.unix)
+            else:
+                listener = await asyncio.start_server(server.connection, args.host, args.port)
+            async with listener:
+                await listener.serve_forever()
+        else:
+            # requests on standard input, replies on standard output
+            loop = asyncio.get_running_loop()
+            reader = asyncio.StreamReader()
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+            def write(line):
+                sys.stdout.write(line + '\n')
+                sys.stdout.flush()
+
+            await server.session(reader, write)
+    finally:
+        runner.cancel()
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+from array import array
+
+import chess
+
+class PositionStore:
+    """Positions packed back to back in one bytearray, see
+    ChessBoard.to_bytes. With dedup a position is kept once, an open
+    addressing table of indices finds it by the hash of its bytes."""
+
+    def __init__(self, dedup=True):
+        self._data = bytearray()
+        self._slots = array('q', [-1]) * 1024 if dedup else None
+
+    def __len__(self):
+        return len(self._data) // chess.PACKED_BYTES
+
+    def __getitem__(self, i):
+        return chess.ChessBoard.from_bytes(self.raw(i))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __contains__(self, chess_board):
+        return self.index(chess_board) is not None
+
+    def raw(self, i):
+        # the packed bytes of a position, without decoding them
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('position index out of range')
+        return bytes(self._data[i * chess.PACKED_BYTES:(i+1) * chess.PACKED_BYTES])
+
+    def index(self, chess_board):
+        # index of the position, None when it is not stored
+        data = chess_board.to_bytes()
+        if self._slots is not None:
+            i = self._slots[self._probe(data)]
+            return i if i >= 0 else None
+        for i in range(len(self)):
+            if self.raw(i) == data:
+                return i
+        return None
+
+    def append(self, chess_board):
+        # index of the position, an existing one when deduplicating
+        return self._append(chess_board.to_bytes())
+
+    def extend(self, chess_boards):
+        for chess_board in chess_boards:
+            self.append(chess_board)
+
+    def tobytes(self):
+        return bytes(self._data)
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(self._data)
+
+    @classmethod
+    def load(cls, filename, dedup=True):
+        store = cls(dedup)
+        with open(filename, 'rb') as f:
+            data = f.read()
+        for i in range(0, len(data), chess.PACKED_BYTES):
+            store._append(data[i:i + chess.PACKED_BYTES])
+        return store
+
+    def _append(self, data):
+        n = len(self)
+        if self._slots is not None:
+            slot = self._probe(data)
+            if self._slots[slot] >= 0:
+                return self._slots[slot]
+            self._slots[slot] = n
+        self._data += data
+        if self._slots is not None and 3 * (n + 1) > 2 * len(self._slots):
+            self._grow()
+        return n
+
+    def _probe(self, data):
+        # slot of the position, or the empty slot it would go to
+        slots = self._slots
+        mask = len(slots) - 1
+        slot = hash(data) & mask
+        while slots[slot] >= 0:
+            i = slots[slot]
+            if self._data[i * chess.PACKED_BYTES:(i+1) * chess.PACKED_BYTES] == data:
+                break
+            slot = (slot + 1) & mask
+        return slot
+
+    def _grow(self):
+        size = chess.PACKED_BYTES
+        slots = self._slots = array('q', [-1]) * (2 * len(self._slots))
+        mask = len(slots) - 1
+        for i in range(len(self)):
+            slot = hash(bytes(self._data[i * size:(i+1) * size])) & mask
+            while slots[slot] >= 0:
+                slot = (slot + 1) & mask
+            slots[slot] = i
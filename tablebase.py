@@ -0,0 +1,312 @@
+import argparse
+import mmap
+import os
+import sys
+import time
+
+from array import array
+from typing import NamedTuple
+
+import chess
+
+# endings of up to 4 pieces, named like KQK or KRKN with the stronger side
+# first, the kings are always the first two pieces of a table
+MAX_PIECES = 4
+MAGIC = b'CTB1'
+_HEADER_BYTES = 16
+_LETTERS = 'QRBNP'
+
+# the 8 symmetries of the board on 0-63 squares, a8 first
+def _transform(t, sq):
+    r, c = divmod(sq, 8)
+    if t & 1:
+        c = 7 - c
+    if t & 2:
+        r = 7 - r
+    if t & 4:
+        r, c = c, r
+    return r * 8 + c
+
+_TRANSFORMS = tuple(tuple(_transform(t, sq) for sq in range(64)) for t in range(8))
+# the white king is moved into the a1-d1-d4 triangle, or onto files a-d
+# when there are pawns, which only allow the file mirror
+_PAWNLESS_KINGS = tuple(sq for sq in range(64) if 7 - sq//8 <= sq%8 <= 3)
+_PAWN_KINGS = tuple(sq for sq in range(64) if sq%8 <= 3)
+
+def _orientation(kings, transforms):
+    return tuple(next(t for t in transforms if _TRANSFORMS[t][sq] in kings) for sq in range(64))
+
+_PAWNLESS_ORIENTATION = _orientation(_PAWNLESS_KINGS, range(8))
+_PAWN_ORIENTATION = _orientation(_PAWN_KINGS, (0, 1))
+_SQ64 = {square: i for i, square in enumerate(chess._SQUARES)}
+
+class Probe(NamedTuple):
+    wdl: int # 1 win, 0 draw, -1 loss for the player to move
+    dtm: int # plies to mate, 0 for a draw
+
+def _strength(letters):
+    return len(letters), tuple(-_LETTERS.index(c) for c in letters)
+
+def _sorted(letters):
+    return ''.join(sorted(letters, key=_LETTERS.index))
+
+def normalize(spec):
+    # the table name of an ending given like KQK, KKQ or kqkr
+    spec = spec.upper()
+    if not spec.startswith('K') or spec.count('K') != 2:
+        raise ValueError(f'{spec} is not an ending!')
+    white, black = (_sorted(side) for side in spec[1:].split('K'))
+    if any(c not in _LETTERS for c in white + black):
+        raise ValueError(f'{spec} is not an ending!')
+    if not 3 <= 2 + len(white) + len(black) <= MAX_PIECES:
+        raise ValueError(f'{spec}: only endings of 3 to {MAX_PIECES} pieces are supported!')
+    if 'P' in white and 'P' in black:
+        raise ValueError(f'{spec}: pawns on both sides are not supported, en passant is not indexed!')
+    if _strength(black) > _strength(white):
+        white, black = black, white
+    return f'K{white}K{black}'
+
+class Table:
+    """One ending, a byte per position and player to move: 0 for a draw or
+    an illegal position, otherwise the distance to mate in plies plus one.
+    Odd distances win and even ones lose for the player to move."""
+
+    def __init__(self, spec, data=None):
+        self.spec = normalize(spec)
+        white, black = self.spec[1:].split('K')
+        self.pieces = (7, 39, *('PNBRQ'.index(c) + 2 for c in white),
+                       *(32 | 'PNBRQ'.index(c) + 2 for c in black))
+        self.pawns = 'P' in self.spec
+        self._kings = _PAWN_KINGS if self.pawns else _PAWNLESS_KINGS
+        self._king_index = {sq: i for i, sq in enumerate(self._kings)}
+        self._orientation = _PAWN_ORIENTATION if self.pawns else _PAWNLESS_ORIENTATION
+        self.size = len(self._kings) * 64 ** (len(self.pieces) - 1) * 2
+        self.data = data
+
+    def index(self, squares, player):
+        # squares in the order of self.pieces, 10x12 numbering
+        transform = _TRANSFORMS[self._orientation[_SQ64[squares[0]]]]
+        i = self._king_index[transform[_SQ64[squares[0]]]]
+        for square in squares[1:]:
+            i = i * 64 + transform[_SQ64[square]]
+        return i * 2 + (0 if player else 1)
+
+    def squares(self, index):
+        # the inverse of index, in the table's orientation
+        player = index % 2 == 0
+        index //= 2
+        squares = []
+        for _ in self.pieces[1:]:
+            index, sq = divmod(index, 64)
+            squares.append(chess._SQUARES[sq])
+        squares.append(chess._SQUARES[self._kings[index]])
+        return squares[::-1], player
+
+    def value(self, index):
+        return self.data[_HEADER_BYTES + index]
+
+class Tablebase:
+    """The tables of a directory, mapped as they are first needed."""
+
+    def __init__(self, directory='.'):
+        self.directory = directory
+        self._tables = {}
+
+    def table(self, spec):
+        spec = normalize(spec)
+        if spec not in self._tables:
+            path = os.path.join(self.directory, f'{spec}.tb')
+            if not os.path.exists(path):
+                return None
+            with open(path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if data[:4] != MAGIC or data[4:_HEADER_BYTES].rstrip(b'\0').decode() != spec:
+                raise ValueError(f'{path} is not the {spec} table!')
+            self._tables[spec] = Table(spec, data)
+        return self._tables[spec]
+
+    def probe(self, chess_board):
+        # exact result of a position of up to 4 pieces, None when there is no
+        # table for it or castling is still possible; also takes a Position
+        value = self._value(chess_board)
+        if value is None or value is True:
+            return None
+        if not value:
+            return Probe(0, 0)
+        dtm = value - 1
+        return Probe(1 if dtm % 2 else -1, dtm)
+
+    def _value(self, chess_board):
+        # table byte of the position, True when its table is missing
+        board = chess_board.board
+        white, black = chess_board.pieces or chess._pieces(board)
+        if len(white) + len(black) > MAX_PIECES:
+            return None
+        for _, king, rook in chess._CASTLING:
+            if board[king]&~32 == 15 and board[rook] == board[king]&32 | 13:
+                return None
+        letters = [_sorted('PNBRQ'[(board[i]&7) - 2] for i in side if board[i]&7 != 7) for side in (white, black)]
+        if len(white) + len(black) <= 3 and (chess_board.signature if chess_board.signature is not None
+                                             else chess._signature(board)) in chess._DRAWS:
+            return 0
+        spec = f'K{letters[0]}K{letters[1]}'
+        try:
+            table = self.table(spec)
+        except ValueError:
+            return None
+        if table is None:
+            return True
+        player = chess_board.player
+        if normalize(spec) != spec:
+            # the stronger side is black, look up the mirrored position with
+            # the colors swapped
+            board = bytes(board[(11 - i//10) * 10 + i%10] ^ 32 if 0 < board[(11 - i//10) * 10 + i%10] < 255
+                          else board[(11 - i//10) * 10 + i%10] for i in range(120))
+            player = not player
+        remaining = {}
+        for i in chess._SQUARES:
+            if board[i]:
+                remaining.setdefault(board[i]&~8, []).append(i)
+        squares = [remaining[piece].pop() for piece in table.pieces]
+        return table.value(table.index(squares, player))
+
+def generate(spec, directory='.', tablebase=None, info=None):
+    # solves an ending by retrograde analysis and writes it to directory,
+    # the endings it converts into are generated first when missing
+    table = Table(spec)
+    tablebase = tablebase or Tablebase(directory)
+    start = time.perf_counter()
+    size, n = table.size, len(table.pieces)
+    values = bytearray(size)
+    counts = array('H', [0]) * size
+    offsets = array('l', [0])
+    successors = array('l')
+    mates = []
+    wins_pending, decrements_pending = {}, {}
+
+    for index in range(size):
+        squares, player = table.squares(index)
+        if len(set(squares)) < n or any(piece&7 == 2 and square//10 in (2, 9)
+                                        for piece, square in zip(table.pieces, squares)):
+            offsets.append(len(successors))
+            continue
+        board = bytearray(chess._EMPTY_BOARD)
+        for piece, square in zip(table.pieces, squares):
+            board[square] = piece
+        w_king, b_king = squares[0], squares[1]
+        # the player not to move cannot be in check
+        if chess._under_attack(board, b_king if player else w_king, player):
+            offsets.append(len(successors))
+            continue
+        check = chess._under_attack(board, w_king if player else b_king, not player)
+        chess_board = chess.ChessBoard(bytes(board), player, 0, 0, w_king, b_king, check)
+        moves = chess.generate_moves(chess_board)
+        counts[index] = len(moves)
+        if not moves and check:
+            values[index] = 1
+            mates.append(index)
+        for packed in moves:
+            square, target = packed & 127, packed >> 7 & 127
+            if board[target] or packed >> 14 & 7:
+                # captures and promotions leave the table
+                position = chess.Position(chess_board)
+                position.make(packed)
+                value = tablebase._value(position)
+                if value is True:
+                    generate(_spec(position), directory, tablebase, info)
+                    value = tablebase._value(position)
+                if value:
+                    dtm = value - 1
+                    if dtm % 2:
+                        decrements_pending.setdefault(dtm, []).append(index)
+                    else:
+                        wins_pending.setdefault(dtm + 1, []).append(index)
+            else:
+                next_squares = [target if s == square else s for s in squares]
+                successors.append(table.index(next_squares, not player))
+        offsets.append(len(successors))
+
+    # invert the move graph
+    predecessor_offsets = array('l', [0]) * (size + 1)
+    for successor in successors:
+        predecessor_offsets[successor + 1] += 1
+    for i in range(size):
+        predecessor_offsets[i + 1] += predecessor_offsets[i]
+    fill = array('l', predecessor_offsets)
+    predecessors = array('l', [0]) * len(successors)
+    for index in range(size):
+        for successor in successors[offsets[index]:offsets[index + 1]]:
+            predecessors[fill[successor]] = index
+            fill[successor] += 1
+    del successors, offsets, fill
+
+    # positions lost in level plies make their predecessors won in level + 1,
+    # positions whose every move reaches a won position are lost one ply later
+    level, losses = 0, mates
+    while losses or any(key > level for key in (*wins_pending, *decrements_pending)):
+        wins = []
+        for lost in losses:
+            for index in predecessors[predecessor_offsets[lost]:predecessor_offsets[lost + 1]]:
+                if not values[index]:
+                    values[index] = level + 2
+                    wins.append(index)
+        for index in wins_pending.pop(level + 1, ()):
+            if not values[index]:
+                values[index] = level + 2
+                wins.append(index)
+        losses = []
+        decrements = [index for won in wins
+                      for index in predecessors[predecessor_offsets[won]:predecessor_offsets[won + 1]]]
+        for index in decrements + decrements_pending.pop(level + 1, []):
+            if not values[index]:
+                counts[index] -= 1
+                if not counts[index]:
+                    values[index] = level + 3
+                    losses.append(index)
+        level += 2
+        if level > 252:
+            raise ValueError(f'{table.spec}: distances beyond 252 plies do not fit a byte!')
+
+    path = os.path.join(directory, f'{table.spec}.tb')
+    with open(path, 'wb') as f:
+        f.write(MAGIC + table.spec.encode().ljust(_HEADER_BYTES - 4, b'\0'))
+        f.write(values)
+    tablebase._tables.pop(table.spec, None)
+    if info is not None:
+        info(table.spec, size, max(values) - 1, time.perf_counter() - start)
+    return path
+
+def _spec(chess_board):
+    board = chess_board.board
+    white, black = chess_board.pieces or chess._pieces(board)
+    return normalize('K' + ''.join('PNBRQ'[(board[i]&7) - 2] for i in white if board[i]&7 != 7) +
+                     'K' + ''.join('PNBRQ'[(board[i]&7) - 2] for i in black if board[i]&7 != 7))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='generate or probe endgame tablebases')
+    parser.add_argument('endings', nargs='*', help='endings to generate, like KQK KRK KPK')
+    parser.add_argument('-d', '--directory', default='.', help='table directory (default: .)')
+    parser.add_argument('--probe', metavar='FEN', help='print the result of a position')
+    args = parser.parse_args(argv)
+    tablebase = Tablebase(args.directory)
+    for spec in args.endings:
+        try:
+            normalize(spec)
+        except ValueError as e:
+            parser.error(str(e))
+    for spec in args.endings:
+        generate(spec, args.directory, tablebase, info=lambda spec, size, longest, seconds: print(
+            f'{spec}: {size} positions, longest mate {longest} plies, {seconds:.1f}s'))
+    if args.probe:
+        try:
+            result = tablebase.probe(chess.ChessBoard.from_fen(args.probe))
+        except chess.FenError as e:
+            parser.error(str(e))
+        if result is None:
+            print('not in the tablebase')
+        else:
+            print({1: 'win', 0: 'draw', -1: 'loss'}[result.wdl] + (f' in {result.dtm} plies' if result.wdl else ''))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
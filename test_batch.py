@@ -0,0 +1,61 @@
+import unittest
+
+import chess
+import search
+
+try:
+    import numpy as np
+    import batch
+except ImportError:
+    np = None
+
+FENS = (
+    chess.START_FEN,
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - -',
+    'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6'
+)
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.chess_boards = [chess.ChessBoard.from_fen(fen) for fen in FENS]
+        self.array = batch.boards(self.chess_boards)
+
+    def test_boards(self):
+        self.assertEqual(self.array.shape, (len(FENS), 120))
+        self.assertEqual(self.array.dtype, np.uint8)
+        self.assertEqual(self.array[1].tobytes(), self.chess_boards[1].board)
+        data = bytearray(b''.join(chess_board.board for chess_board in self.chess_boards))
+        array = batch.boards(data)
+        data[0] = 7
+        self.assertEqual(array[0, 0], 7)
+
+    def test_material(self):
+        counts = batch.material(self.array)
+        self.assertEqual(counts.shape, (len(FENS), 12))
+        self.assertEqual(counts[0].tolist(), [8, 2, 2, 2, 1, 1] * 2)
+        for chess_board, row in zip(self.chess_boards, counts):
+            for piece, count in zip(batch.PIECES, row):
+                self.assertEqual(len(chess_board.squares(not piece&32, piece&7)), count)
+
+    def test_scores(self):
+        player = batch.players(self.chess_boards)
+        for chess_board, score in zip(self.chess_boards, batch.scores(self.array, player)):
+            self.assertEqual(search.evaluate(chess.Position(chess_board)), score)
+        self.assertEqual(batch.scores(self.array)[0], 0)
+
+    def test_planes(self):
+        planes = batch.planes(self.array)
+        self.assertEqual(planes.shape, (len(FENS), 12, 8, 8))
+        self.assertEqual(planes.dtype, np.uint8)
+        self.assertEqual(planes.sum(axis=(2, 3)).tolist(), batch.material(self.array).tolist())
+        # white king on e1, black pawn on e5 after 1. e4 e5
+        self.assertEqual(planes[0, 5, 7, 4], 1)
+        self.assertEqual(planes[4, 6, 3, 4], 1)
+        self.assertEqual(planes[4, 6, 1, 4], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import random
+import tempfile
+import unittest
+
+import book
+import chess
+import pgn
+import test_pgn
+
+class TestBook(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_book(self):
+        replays = list(map(pgn.replay, pgn.read_games(test_pgn.GAMES.splitlines())))
+        self.assertEqual(book.build(replays * 3, self.filename, plies=6), 6)
+        with book.Book(self.filename) as opening_book:
+            self.assertEqual(len(opening_book), 6)
+            # the winner's moves only, the loser's score 0, every move of the
+            # unfinished game scores 1
+            chess_board = chess.new_game()
+            for an, weight in [('e2e4', 6), ('e7e5', None), ('g1f3', 6), ('d7d6', None), ('d2d4', 6)]:
+                entries = [(chess._move2an(packed), w) for packed, w in opening_book.entries(chess_board)]
+                self.assertEqual(entries, [(an, weight)] if weight else [])
+                packed = opening_book.choose(chess_board, random.Random(1))
+                self.assertEqual(packed and chess._move2an(packed), an if weight else None)
+                chess_board = chess.play_move(chess_board, next(
+                    m for m in chess.generate_moves(chess_board) if chess._move2an(m) == an))
+            self.assertEqual(opening_book.entries(chess.ChessBoard.from_fen('4k3/8/8/8/8/8/8/4K3 w - -')), [])
+
+    def test_polyglot(self):
+        chess_board = chess.ChessBoard.from_fen('r3k2r/8/8/8/8/8/8/R3K2R w KQkq -')
+        moves = {chess._move2an(packed): book.polyglot_move(packed) for packed in chess.generate_moves(chess_board)}
+        # e1h1 and e1a1 for castling, squares count from a1
+        self.assertEqual(moves['e1g1'], 7 | 4 << 6)
+        self.assertEqual(moves['e1c1'], 0 | 4 << 6)
+        chess_board = chess.ChessBoard.from_fen('8/1P6/8/8/8/8/8/k6K w - -')
+        promotions = {book.polyglot_move(packed) >> 12 for packed in chess.generate_moves(chess_board)
+                      if packed >> 14 & 7}
+        self.assertEqual(promotions, {1, 2, 3, 4})
+        # en passant counts only when a pawn can take
+        keys = [book.polyglot_key(chess.ChessBoard.from_fen(fen)) for fen in [
+            'rnbqkbnr/ppp1pppp/8/3p4/8/8/PPPPPPPP/RNBQKBNR w KQkq d6',
+            'rnbqkbnr/ppp1pppp/8/3p4/8/8/PPPPPPPP/RNBQKBNR w KQkq -',
+            'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6',
+            'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq -'
+        ]]
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(keys[2], keys[3])
+        # the reference keys of the Polyglot book format description
+        def play(chess_board, *moves):
+            for an in moves:
+                chess_board = chess.play_move(chess_board, next(
+                    m for m in chess.generate_moves(chess_board) if chess._move2an(m) == an))
+            return chess_board
+
+        chess_board = chess.new_game()
+        self.assertEqual(book.polyglot_key(chess_board), 0x463B96181691FC9C)
+        for an, key in [('e2e4', 0x823C9B50FD114196), ('d7d5', 0x0756B94461C50FB0), ('e4e5', 0x662FAFB965DB29D4),
+                        ('f7f5', 0x22A48B5A8E47FF78), ('e1e2', 0x652A607CA3F242C1), ('e8f7', 0x00FDD303C946BDD9)]:
+            chess_board = play(chess_board, an)
+            self.assertEqual(book.polyglot_key(chess_board), key, an)
+        chess_board = play(chess.new_game(), 'a2a4', 'b7b5', 'h2h4', 'b5b4', 'c2c4')
+        self.assertEqual(book.polyglot_key(chess_board), 0x3C8123EA7B067637)
+        self.assertEqual(book.polyglot_key(play(chess_board, 'b4c3', 'a1a3')), 0x5C3F9B829B279560)
+        with open(self.filename, 'w') as f:
+            f.write(', '.join('0x%016X' % n for n in book.RANDOM64))
+        self.assertEqual(book.load_random64(self.filename), book.RANDOM64)
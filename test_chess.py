@@ -201,6 +201,326 @@ class TestChessBoard(unittest.TestCase):
                         actual_moves[(chess._i2symbol(chess_board.board[square]), square)] = set(moves)
                 self.assertEqual(actual_moves, correct_moves)
 
+    def test_perft(self):
+        positions = [
+            (self.__load_test_position('board.bin', 95, 25), [20, 400]),
+            (self.__load_test_position('position2.bin', 95, 25), [48, 2039]),
+            (self.__load_test_position('position3.bin', 51, 68), [14, 191, 2812]),
+            (self.__load_test_position('position4.bin', 97, 25), [6, 264]),
+            (self.__load_test_position('position5.bin', 95, 26), [44, 1486]),
+            (self.__load_test_position('position6.bin', 97, 27), [46, 2079])
+        ]
+        for chess_board, nodes in positions:
+            for depth, correct_nodes in enumerate(nodes, 1):
+                with self.subTest(chess_board=chess_board, depth=depth):
+                    self.assertEqual(chess.perft(chess_board, depth), correct_nodes)
+
+    def test_divide(self):
+        chess_board = self.__load_test_position('position4.bin', 97, 25)
+        self.assertEqual(chess.divide(chess_board, 1), {
+            'g1h1': 1, 'f1f2': 1, 'd2d4': 1, 'c4c5': 1, 'b4c5': 1, 'f3d4': 1
+        })
+        self.assertEqual(sum(chess.divide(chess_board, 2).values()), 264)
+
+    def test_under_attack(self):
+        chess_board = self.__load_test_position('board.bin', 95, 25)
+        board = bytearray(chess_board.board)
+        board[96] = board[97] = 0 # clear f1 and g1
+        board[85] = 34 # black pawn on e2 covers d1 and f1
+        self.assertTrue(chess._under_attack(board, 96, False))
+        self.assertFalse(chess._under_attack(board, 97, False))
+        chess_board = chess_board._replace(board=bytes(board))
+        self.assertNotIn(97, chess.legal_moves(chess_board, 95, castle=True))
+
+    def test_generate_moves(self):
+        positions = [
+            (self.__load_test_position('board.bin', 95, 25), initial_moves),
+            (self.__load_test_position('position2.bin', 95, 25), moves2),
+            (self.__load_test_position('position3.bin', 51, 68), moves3),
+            (self.__load_test_position('position4.bin', 97, 25), moves4),
+            (self.__load_test_position('position5.bin', 95, 26), moves5),
+            (self.__load_test_position('position6.bin', 97, 27), moves6)
+        ]
+        buffer = []
+        for chess_board, correct_moves in positions:
+            with self.subTest(chess_board=chess_board):
+                moves = chess.generate_moves(chess_board, buffer)
+                self.assertIs(moves, buffer)
+                actual_moves = {(m & 127, m >> 7 & 127) for m in moves}
+                self.assertEqual(actual_moves, {
+                    (square, target) for (symbol, square), targets in correct_moves.items()
+                    if symbol in chess.W_PIECES for target in targets
+                })
+        chess_board = self.__load_test_position('position2.bin', 95, 25)
+        castles = {m for m in chess.generate_moves(chess_board) if m & chess.CASTLE}
+        self.assertEqual(castles, {95 | 97 << 7 | chess.CASTLE, 95 | 93 << 7 | chess.CASTLE})
+        chess_board = self.__load_test_position('position5.bin', 95, 26)
+        promotions = {m >> 14 & 7 for m in chess.generate_moves(chess_board) if m & 127 == 34}
+        self.assertEqual(promotions, {3, 4, 5, 6})
+
+    def test_make_unmake(self):
+        positions = [
+            self.__load_test_position('position2.bin', 95, 25),
+            self.__load_test_position('position4.bin', 97, 25),
+            self.__load_test_position('position5.bin', 95, 26)
+        ]
+        for chess_board in positions:
+            position = chess.Position(chess_board)
+            self.assertEqual(position.to_board(), chess_board)
+            for packed, (_, next_board) in zip(chess.generate_moves(chess_board), chess._successors(chess_board)):
+                with self.subTest(chess_board=chess_board, move=chess._move2an(packed)):
+                    position.make(packed)
+                    self.assertEqual(position.to_board(), next_board)
+                    for reply in chess.generate_moves(position):
+                        position.make(reply)
+                        position.unmake()
+                    self.assertEqual(position.to_board(), next_board)
+                    position.unmake()
+                    self.assertEqual(position.to_board(), chess_board)
+            self.assertEqual(position.perft(2), chess.perft(chess_board, 2))
+
+    def test_zobrist(self):
+        positions = [
+            self.__load_test_position('position2.bin', 95, 25),
+            self.__load_test_position('position4.bin', 97, 25),
+            self.__load_test_position('position5.bin', 95, 26)
+        ]
+        keys = set()
+        for chess_board in positions:
+            for _, next_board in chess._successors(chess_board):
+                with self.subTest(chess_board=next_board):
+                    self.assertEqual(next_board.key, chess.zobrist(next_board))
+                    keys.add(next_board.key)
+        self.assertEqual(len(keys), 48 + 6 + 44)
+        # the cached key, pieces and signature take no part in equality
+        chess_board = positions[0]._replace(key=chess.zobrist(positions[0]))
+        self.assertEqual(chess_board, positions[0])
+        self.assertEqual(hash(chess_board), hash(positions[0]))
+        self.assertEqual(self.__load_test_position('board.bin', 95, 25), chess.new_game())
+        position = chess.Position(chess.new_game())
+        for an in ['g1f3', 'g8f6', 'f3g1', 'f6g8']:
+            position.make(next(m for m in chess.generate_moves(position) if chess._move2an(m) == an))
+        self.assertEqual(position.key, chess.new_game().key)
+        self.assertEqual(position.repetitions(), 1)
+        # a king that moved takes the castling flags of its rooks along, the
+        # same position reached either way has one key
+        shuffle = 'g1f3 g8f6 h1g1 h8g8 g1h1 g8h8 f3g1 f6g8'.split()
+        chess_boards = []
+        king_walk = 'e2e4 e7e5 e1e2 e8e7 e2e1 e7e8'.split()
+        for moves in (king_walk, king_walk + shuffle):
+            chess_board, position = chess.new_game(), chess.Position(chess.new_game())
+            for an in moves:
+                packed = next(m for m in chess.generate_moves(chess_board) if chess._move2an(m) == an)
+                chess_board = chess.play_move(chess_board, packed)
+                position.make(packed)
+                self.assertEqual(position.key, chess_board.key)
+            self.assertEqual(position.to_board(), chess_board)
+            self.assertEqual(chess.ChessBoard.from_fen(chess_board.to_fen()), chess_board)
+            chess_boards.append(chess_board)
+            for _ in moves:
+                position.unmake()
+            self.assertEqual(position.to_board(), chess.new_game())
+        self.assertEqual(chess_boards[0].key, chess_boards[1].key)
+
+    def test_cache(self):
+        chess_board = chess.new_game()
+        for square, position in [('f2', 'f3'), ('e7', 'e5'), ('g2', 'g4'), ('d8', 'h4')]:
+            chess_board = chess.move(chess_board, square, position)
+        self.assertEqual(chess.status(chess_board), 'checkmate')
+        chess.enable_cache(1 << 20)
+        try:
+            self.assertEqual(chess.cache_stats()['slots'], 1024)
+            for _ in range(2):
+                self.assertEqual(chess.status(chess_board), 'checkmate')
+                self.assertFalse(chess_board)
+                self.assertTrue(chess_board.material)
+            self.assertEqual(chess.status(chess.new_game()), None)
+            chess_board = self.__load_test_position('position2.bin', 95, 25)
+            for _ in range(2):
+                actual_moves = {}
+                for square in range(21, 100):
+                    if 0 < chess_board.board[square] < 255:
+                        moves = chess.legal_moves(chess_board, square, castle=True)
+                        actual_moves[(chess._i2symbol(chess_board.board[square]), square)] = set(moves)
+                self.assertEqual(actual_moves, moves2)
+            self.assertNotIn(93, chess.legal_moves(chess_board, 95))
+            self.assertEqual(chess.perft(chess_board, 2), 2039)
+            stats = chess.cache_stats()
+            self.assertGreater(stats['hits'], stats['misses'])
+        finally:
+            chess.disable_cache()
+        self.assertIsNone(chess.cache_stats())
+
+        table = chess.TranspositionTable(4096, entry_bytes=1024)
+        self.assertTrue(table.store(1, 3, 'deep'))
+        self.assertFalse(table.store(5, 2, 'shallow')) # same slot, shallower
+        self.assertEqual(table.probe(1), 'deep')
+        self.assertIsNone(table.probe(5))
+        table.new_generation()
+        self.assertTrue(table.store(5, 0, 'new')) # older entries give way
+        self.assertEqual(table.probe(5), 'new')
+        self.assertEqual(table.stats['replacements'], 1)
+
+    def test_pieces(self):
+        chess_board = self.__load_test_position('position2.bin', 95, 25)
+        self.assertEqual(chess_board.squares(True, 7), {95})
+        self.assertEqual(chess_board.squares(False, 5), {21, 28})
+        for _, next_board in chess._successors(chess_board):
+            for _, board in chess._successors(next_board):
+                with self.subTest(chess_board=board):
+                    self.assertEqual(board.pieces, chess._pieces(board.board))
+
+    def test_material(self):
+        chess_board = self.__load_test_position('board.bin', 95, 25)
+        self.assertTrue(chess_board.material)
+        for pieces, material in [
+            ({95: 7, 25: 39}, False), # K vs K
+            ({95: 7, 25: 39, 22: 35}, False), # K vs KN
+            ({95: 7, 25: 39, 22: 35, 27: 35}, False), # K vs KNN
+            ({95: 7, 25: 39, 22: 35, 27: 35, 23: 36}, True), # K vs KBNN
+            ({95: 7, 25: 39, 93: 4, 26: 36}, False), # KB vs KB on dark squares
+            ({95: 7, 25: 39, 93: 4, 23: 36}, True), # KB vs KB on opposite colors
+            ({95: 7, 25: 39, 93: 4, 22: 35}, False), # KB vs KN
+            ({95: 7, 25: 39, 85: 2}, True) # KP vs K
+        ]:
+            board = bytearray(chess_board.board)
+            for i in range(21, 99):
+                if board[i] != 255:
+                    board[i] = pieces.get(i, 0)
+            with self.subTest(pieces=pieces):
+                self.assertEqual(chess_board._replace(board=bytes(board)).material, material)
+        for _, next_board in chess._successors(self.__load_test_position('position4.bin', 97, 25)):
+            for _, board in chess._successors(next_board):
+                self.assertEqual(board.signature, chess._signature(board.board))
+
+    def test_check_evasions(self):
+        chess_board = self.__load_test_position('board.bin', 95, 25)
+        for square, position in [('e2', 'e4'), ('f7', 'f6'), ('d1', 'h5')]:
+            chess_board = chess.move(chess_board, square, position)
+        self.assertTrue(chess_board.check)
+        evasions, pins = chess._checks_and_pins(chess_board.board, 25)
+        self.assertEqual(evasions, {36, 47, 58})
+        self.assertEqual(pins, {})
+        actual_moves = {}
+        for square in range(21, 100):
+            if 32 <= chess_board.board[square] < 64:
+                moves = chess.legal_moves(chess_board, square, castle=True)
+                if moves:
+                    actual_moves[square] = set(moves)
+        self.assertEqual(actual_moves, {37: {47}})
+
+    def test_fen(self):
+        for filename, wk, bk, fen in [
+            ('board.bin', 95, 25, chess.START_FEN),
+            ('position2.bin', 95, 25, 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'),
+            ('position3.bin', 51, 68, '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1'),
+            ('position4.bin', 97, 25, 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1'),
+            ('position5.bin', 95, 26, 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 0 1'),
+            ('position6.bin', 97, 27, 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 1')
+        ]:
+            chess_board = self.__load_test_position(filename, wk, bk)
+            with self.subTest(fen=fen):
+                # the white king is in check in position 4
+                self.assertEqual(chess.ChessBoard.from_fen(fen), chess_board._replace(check=filename == 'position4.bin'))
+                self.assertEqual(chess_board.to_fen(), fen)
+        self.assertEqual(chess.new_game().to_fen(), chess.START_FEN)
+        # en passant names the passed square, check is derived from the board
+        chess_board = chess.new_game()
+        for square, position in [('e2', 'e4'), ('f7', 'f5'), ('e4', 'f5'), ('g7', 'g5')]:
+            chess_board = chess.move(chess_board, square, position)
+        fen = 'rnbqkbnr/ppppp2p/8/5Pp1/8/8/PPPP1PPP/RNBQKBNR w KQkq g6 0 1'
+        self.assertEqual(chess_board.to_fen(), fen)
+        self.assertEqual(chess.ChessBoard.from_fen(fen), chess_board)
+        chess_board = chess.move(chess_board, 'd1', 'h5')
+        self.assertEqual(chess.ChessBoard.from_fen(chess_board.to_fen()), chess_board)
+        self.assertTrue(chess.ChessBoard.from_fen(chess_board.to_fen()).check)
+        for fen in [
+            '',
+            'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq -',
+            'rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -',
+            'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq -',
+            'rnbq1bnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQ -',
+            'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBN1 w KQkq -',
+            'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e3'
+        ]:
+            with self.subTest(fen=fen):
+                self.assertRaises(chess.FenError, chess.ChessBoard.from_fen, fen)
+
+    def test_read_epd(self):
+        records = list(chess.read_epd([
+            '# perft suite',
+            'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 ;D1 20 ;D2 400',
+            '',
+            '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - bm Rxb4+; id "position3";'
+        ]))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0], (chess.new_game(), {'D1': '20', 'D2': '400'}))
+        self.assertEqual(records[1][0].w_king, 51)
+        self.assertEqual(records[1][1], {'bm': 'Rxb4+', 'id': 'position3'})
+
+    def test_move_validation(self):
+        chess_board = chess.new_game()
+        # the opponent's pieces cannot be moved, by either player
+        self.assertRaises(chess.MoveError, chess.move, chess_board, 'e7', 'e5')
+        chess_board = chess.move(chess_board, 'e2', 'e4')
+        self.assertRaises(chess.MoveError, chess.move, chess_board, 'd2', 'd4')
+        self.assertRaises(chess.PromotionError, chess.promote, chess_board, 1)
+        # a pending promotion has to be resolved first
+        chess_board = chess.move(chess.ChessBoard.from_fen('7k/4P3/8/8/8/8/8/4K3 w - -'), 'e7', 'e8')
+        self.assertEqual(chess_board.promoted, 25)
+        self.assertRaises(chess.PromotionError, chess.move, chess_board, 'h8', 'h7')
+        self.assertRaises(chess.PromotionError, chess.promote, chess_board, 5)
+        chess_board = chess.promote(chess_board, 2)
+        self.assertEqual(chess_board.to_fen(), '4R2k/8/8/8/8/8/8/4K3 b - - 0 1')
+        self.assertEqual(chess_board.check, True)
+
+    def test_iter_moves(self):
+        for fen in ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -',
+                    'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq -',
+                    'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ -',
+                    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -'):
+            with self.subTest(fen=fen):
+                chess_board = chess.ChessBoard.from_fen(fen)
+                moves = list(chess.iter_moves(chess_board))
+                self.assertCountEqual(moves, chess.generate_moves(chess_board))
+                # captures and promotions come first and are all there is without quiet
+                noisy = [bool(chess_board.board[m >> 7 & 127] or m & (chess.EN_PASSANT | 0x1c000)) for m in moves]
+                self.assertEqual(noisy, sorted(noisy, reverse=True))
+                self.assertEqual(list(chess.iter_moves(chess_board, quiet=False)), moves[:sum(noisy)])
+        # in check the king moves first, then the capture of the checker, then blocks
+        chess_board = chess.ChessBoard.from_fen('4k3/8/8/8/1b6/R7/2N5/4K3 w - -')
+        self.assertEqual(list(map(chess._move2an, chess.iter_moves(chess_board))),
+                         ['e1e2', 'e1f2', 'e1d1', 'e1f1', 'c2b4', 'a3c3'])
+        self.assertEqual(bool(chess.ChessBoard.from_fen('7k/5Q2/6K1/8/8/8/8/8 b - -')), False)
+
+    def test_profile(self):
+        legal_moves = chess.legal_moves
+        self.assertIsNone(chess.stats())
+        chess.enable_profile()
+        try:
+            chess_board = chess.move(chess.new_game(), 'e2', 'e4')
+            self.assertRaises(chess.MoveError, chess.move, chess_board, 'e4', 'e5')
+            self.assertTrue(chess_board)
+            stats = chess.stats()
+            # a pawn move and the move generation behind bool copy the board
+            # once each, a king move twice, the rejected move is left out
+            chess_board = chess.move(chess_board, 'e7', 'e5')
+            chess_board = chess.move(chess_board, 'e1', 'e2')
+            boards_per_move = chess.stats()['boards_per_move']
+        finally:
+            chess.disable_profile()
+        self.assertEqual(stats['move']['calls'], 2)
+        self.assertEqual(stats['move']['errors'], 1)
+        self.assertEqual(stats['__bool__']['calls'], 1)
+        self.assertEqual(stats['legal_moves']['calls'], 1)
+        self.assertGreater(stats['_under_attack']['calls'], 0)
+        self.assertGreater(stats['_move_piece']['calls'], 0)
+        self.assertEqual(stats['boards_per_move'], 2.0)
+        self.assertEqual(boards_per_move, 5 / 3)
+        self.assertGreater(stats['move']['seconds'], 0)
+        self.assertIsNone(chess.stats())
+        self.assertIs(chess.legal_moves, legal_moves)
+
     @staticmethod
     def __load_test_position(filename, wk, bk):
         with open(filename, mode='rb') as f:
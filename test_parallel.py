@@ -0,0 +1,38 @@
+import unittest
+
+import chess
+import parallel
+import pgn
+import search
+import selfplay
+import test_pgn
+
+class TestParallel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = parallel.Pool(2)
+        with open('position2.bin', mode='rb') as f:
+            cls.chess_board = chess.ChessBoard(f.read(120), True, 0, 0, 95, 25)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def test_perft(self):
+        self.assertEqual(self.pool.perft(self.chess_board, 0), chess.perft(self.chess_board, 0))
+        self.assertEqual(self.pool.perft(self.chess_board, 1), 48)
+        self.assertEqual(self.pool.divide(self.chess_board, 2), chess.divide(self.chess_board, 2))
+
+    def test_search(self):
+        result = self.pool.search(self.chess_board, search.Limits(depth=2))
+        self.assertIn(result.move, chess.generate_moves(self.chess_board))
+        self.assertEqual(result.depth, 2)
+
+    def test_replay(self):
+        games = list(pgn.read_games(test_pgn.GAMES.splitlines())) * 5
+        self.assertEqual(list(self.pool.replay(iter(games), batch=2)), list(map(pgn.replay, games)))
+
+    def test_selfplay(self):
+        games = list(self.pool.selfplay(range(5), batch=2, max_plies=30, sample=0.2))
+        self.assertEqual(games, [selfplay.play(seed, max_plies=30, sample=0.2) for seed in range(5)])
@@ -0,0 +1,66 @@
+import unittest
+
+import chess
+import pgn
+
+GAMES = '''[Event "Opera Game"]
+[White "Morphy"]
+[Black "Duke Karl / Count Isouard"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 d6 3. d4 Bg4 {This is a weak move
+already.} 4. dxe5 Bxf3 5. Qxf3 dxe5 6. Bc4 Nf6 7. Qb3 Qe7 8. Nc3 c6 9. Bg5 b5
+10. Nxb5 cxb5 11. Bxb5+ Nbd7 12. O-O-O Rd8 13. Rxd7 Rxd7 14. Rd1 Qe6 (14... Qb4 15. Bxf6)
+15. Bxd7+ Nxd7 16. Qb8+ $1 Nxb8 17. Rd8# 1-0
+
+[Event "Promotion"]
+[SetUp "1"]
+[FEN "8/4P1k1/8/8/8/8/8/4K3 w - - 0 1"]
+
+1. e8=N+ Kf7 2. Nd6+ ; underpromotion
+*
+
+[Event "Illegal"]
+
+1. e4 e5 2. Ke3 1/2-1/2
+
+[Event "Illegal from a position"]
+[SetUp "1"]
+[FEN "4k3/8/8/8/8/8/4P3/4K3 b - - 3 40"]
+
+40... Kd7 41. e4 Kc8 42. Ke2 Kc6 1/2-1/2
+'''
+
+class TestPgn(unittest.TestCase):
+
+    def test_read_games(self):
+        games = list(pgn.read_games(GAMES.splitlines(keepends=True)))
+        self.assertEqual([game.result for game in games], ['1-0', '*', '1/2-1/2', '1/2-1/2'])
+        self.assertEqual(games[0].headers['White'], 'Morphy')
+        self.assertEqual(len(games[0].moves), 33)
+        self.assertEqual(games[0].moves[5:7], ('Bg4', 'dxe5'))
+        self.assertNotIn('Qb4', games[0].moves)
+        self.assertEqual(games[1].moves, ('e8=N+', 'Kf7', 'Nd6+'))
+
+    def test_parse_san(self):
+        chess_board = chess.ChessBoard.from_fen('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -')
+        for san, an in [('O-O', 'e1g1'), ('O-O-O', 'e1c1'), ('Nxf7', 'e5f7'), ('dxe6', 'd5e6'),
+                        ('Bxa6', 'e2a6'), ('Qxh3', 'f3h3'), ('Rb1', 'a1b1'), ('g4', 'g2g4')]:
+            with self.subTest(san=san):
+                self.assertEqual(chess._move2an(chess.parse_san(chess_board, san)), an)
+        chess_board = chess.ChessBoard.from_fen('3k4/8/8/8/8/8/4K3/R6R w - -')
+        self.assertEqual(chess._move2an(chess.parse_san(chess_board, 'Rhd1')), 'h1d1')
+        self.assertRaises(chess.MoveError, chess.parse_san, chess_board, 'Rd1')
+        self.assertRaises(chess.MoveError, chess.parse_san, chess_board, 'O-O')
+        self.assertRaises(chess.MoveError, chess.parse_san, chess_board, 'Zz9')
+
+    def test_replay(self):
+        replays = list(pgn.replay_games(pgn.read_games(GAMES.splitlines())))
+        self.assertEqual([r.legal for r in replays], [True, True, False, False])
+        self.assertEqual(replays[0].plies, 33)
+        self.assertEqual(chess.status(chess.ChessBoard.from_fen(replays[0].fen)), 'checkmate')
+        self.assertEqual(replays[1].fen, '8/5k2/3N4/8/8/8/8/4K3 b - - 0 1')
+        self.assertEqual(replays[2].plies, 2)
+        self.assertEqual(replays[2].error, '2. Ke3 invalid move!')
+        self.assertEqual(replays[3].plies, 4)
+        self.assertEqual(replays[3].error, '42... Kc6 invalid move!')
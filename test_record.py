@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+import chess
+import pgn
+import record
+import test_pgn
+
+class TestRecord(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_record(self):
+        replays = [r for r in map(pgn.replay, pgn.read_games(test_pgn.GAMES.splitlines())) if r.legal]
+        starts = [chess.ChessBoard.from_fen(r.headers['FEN']) if 'FEN' in r.headers else None for r in replays]
+        with record.GameWriter(self.filename, interval=4) as writer:
+            for r, start in zip(replays, starts):
+                writer.add(r.moves, start, r.result)
+        with record.GameFile(self.filename) as games:
+            self.assertEqual(len(games), 2)
+            for game, r, start in zip(games, replays, starts):
+                boards = [start or chess.new_game()]
+                for packed in r.moves:
+                    boards.append(chess.play_move(boards[-1], packed))
+                self.assertEqual((game.result, len(game)), (r.result, r.plies))
+                self.assertEqual(game.moves(), list(r.moves))
+                self.assertEqual(list(game.positions()), boards)
+                for ply, chess_board in enumerate(boards):
+                    with self.subTest(ply=ply):
+                        self.assertEqual(game.position(ply), chess_board)
+                self.assertEqual(game.position(-1).to_fen(), r.fen)
+            self.assertEqual(games[-1].result, '*')
+            self.assertRaises(IndexError, games.__getitem__, 2)
+            self.assertRaises(IndexError, games[0].position, 34)
+
+    def test_pack(self):
+        # castling, en passant and promotions are restored from the board
+        chess_board = chess.ChessBoard.from_fen('r3k3/1P6/8/8/5pP1/8/8/4K2R b Kq g3')
+        for packed in chess.generate_moves(chess_board):
+            self.assertEqual(record._unpack(chess_board.board, record._pack(packed)), packed)
+            self.assertLess(record._pack(packed), 1 << 16)
+        chess_board = chess.play_move(chess_board, chess.parse_san(chess_board, 'Kd8'))
+        for packed in chess.generate_moves(chess_board):
+            self.assertEqual(record._unpack(chess_board.board, record._pack(packed)), packed)
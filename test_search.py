@@ -0,0 +1,35 @@
+import unittest
+
+import chess
+import search
+
+class TestSearch(unittest.TestCase):
+
+    def test_mate_in_one(self):
+        chess_board = chess.new_game()
+        for square, position in [('e2', 'e4'), ('e7', 'e5'), ('f1', 'c4'), ('b8', 'c6'), ('d1', 'h5'), ('g8', 'f6')]:
+            chess_board = chess.move(chess_board, square, position)
+        result = search.search(chess_board, search.Limits(depth=3))
+        self.assertEqual(chess._move2an(result.move), 'h5f7')
+        self.assertEqual(result.mate, 1)
+        chess_board = chess.play_move(chess_board, result.move)
+        self.assertEqual(chess.status(chess_board), 'checkmate')
+        self.assertEqual(search.search(chess_board).score, -search.MATE)
+
+    def test_limits(self):
+        with open('position2.bin', mode='rb') as f:
+            chess_board = chess.ChessBoard(f.read(120), True, 0, 0, 95, 25)
+        depths = []
+        searcher = search.Searcher()
+        result = searcher.search(chess_board, search.Limits(depth=2), info=depths.append)
+        self.assertEqual([r.depth for r in depths], [1, 2])
+        self.assertEqual(result.depth, 2)
+        shallow = search.Searcher().search(chess.new_game(), search.Limits(depth=0, nodes=20000))
+        self.assertEqual(shallow.depth, 1)
+        self.assertIn(shallow.move, chess.generate_moves(chess.new_game()))
+        # the principal variation is playable through the move validator
+        for packed in result.pv:
+            chess_board = chess.play_move(chess_board, packed)
+        result = searcher.search(chess_board, search.Limits(nodes=500))
+        self.assertLessEqual(result.nodes, 500)
+        self.assertIn(result.move, chess.generate_moves(chess_board))
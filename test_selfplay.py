@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+
+import chess
+import record
+import selfplay
+import store
+
+class TestSelfPlay(unittest.TestCase):
+
+    def test_play(self):
+        for seed, policy in ((1, 'random'), (2, 'weighted')):
+            with self.subTest(seed=seed, policy=policy):
+                game = selfplay.play(seed, policy, sample=0.5)
+                self.assertEqual(selfplay.play(seed, policy, sample=0.5), game)
+                chess_board = chess.new_game()
+                for packed in game.moves:
+                    self.assertIn(packed, chess.generate_moves(chess_board))
+                    chess_board = chess.play_move(chess_board, packed)
+                if game.termination == 'checkmate':
+                    self.assertFalse(chess_board)
+                    self.assertEqual(game.result, '0-1' if chess_board.player else '1-0')
+                elif game.termination == 'insufficient material':
+                    self.assertFalse(chess_board.material)
+                self.assertTrue(game.positions)
+                self.assertTrue(all(len(position) == chess.PACKED_BYTES for position in game.positions))
+        game = selfplay.play(3, max_plies=10)
+        self.assertEqual((len(game.moves), game.result, game.termination), (10, '*', 'max plies'))
+        self.assertEqual(game.positions, ())
+
+    def test_play_games(self):
+        games = list(selfplay.play_games(3, seed=5, max_plies=40))
+        self.assertEqual([game.seed for game in games], [5, 6, 7])
+        self.assertEqual(games[1], selfplay.play(6, max_plies=40))
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory:
+            games, positions = os.path.join(directory, 'games'), os.path.join(directory, 'positions')
+            selfplay.main([games, '-n', '4', '-j', '1', '--max-plies', '60', '--positions', positions])
+            with record.GameFile(games) as game_file:
+                self.assertEqual(len(game_file), 4)
+                self.assertEqual(game_file[2].moves(), list(selfplay.play(2, max_plies=60).moves))
+            self.assertEqual(os.path.getsize(positions) % chess.PACKED_BYTES, 0)
+            self.assertTrue(len(store.PositionStore.load(positions, dedup=False)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import unittest
+
+from unittest import mock
+
+import server
+
+class TestServer(unittest.TestCase):
+
+    def run_requests(self, *requests, batch=256):
+        game_server = server.GameServer(batch)
+
+        async def session():
+            runner = asyncio.ensure_future(game_server.run())
+            futures = [await game_server.submit(request) for request in requests]
+            replies = [await future for future in futures]
+            runner.cancel()
+            return replies
+
+        return game_server, asyncio.run(session())
+
+    def test_game(self):
+        moves = ['f2f3', 'e7e5', 'g2g4', 'd8h4']
+        game_server, replies = self.run_requests(
+            {'op': 'new'}, *({'op': 'move', 'game': 1, 'move': move} for move in moves),
+            {'op': 'move', 'game': 1, 'move': 'a2a3'}, {'op': 'stats'}
+        )
+        self.assertEqual([reply['player'] for reply in replies[:5]], ['w', 'b', 'w', 'b', 'w'])
+        self.assertEqual(replies[4]['status'], 'checkmate')
+        self.assertEqual(replies[4]['result'], '0-1')
+        self.assertEqual(replies[4]['check'], True)
+        self.assertEqual(replies[5], {'error': 'game 1 is over: checkmate', 'game': 1})
+        self.assertEqual(replies[6]['requests'], 7)
+        self.assertEqual(game_server.games[1].metrics()['requests'], 6)
+
+    def test_validation(self):
+        _, replies = self.run_requests(
+            {'op': 'new', 'id': 'a'},
+            {'op': 'move', 'game': 1, 'move': 'e7e5'},
+            {'op': 'move', 'game': 1, 'move': 'e2e5'},
+            {'op': 'move', 'game': 1, 'move': 'e2e4x'},
+            {'op': 'move', 'game': 2, 'move': 'e2e4'},
+            {'op': 'new', 'fen': 'foo'},
+            {'op': 'jump'},
+            ['new'],
+            ValueError('Expecting value')
+        )
+        self.assertEqual(replies[0]['id'], 'a')
+        self.assertTrue(all('error' in reply for reply in replies[1:]))
+        self.assertEqual(replies[1], {'error': '♟e7 e5 invalid move!', 'game': 1})
+
+    def test_bad_requests(self):
+        # wrong types and unexpected errors are answered, later requests still are
+        with mock.patch.object(server.GameServer, 'stats', side_effect=KeyError('boom')):
+            _, replies = self.run_requests(
+                {'op': 'new', 'fen': 5},
+                {'op': 'new'},
+                {'op': 'move', 'game': [1], 'move': 'e2e4'},
+                {'op': 'move', 'game': True, 'move': 'e2e4'},
+                {'op': 'move', 'game': 1, 'move': ['e2e4']},
+                {'op': 'promote', 'game': 1, 'piece': 5},
+                {'op': 'stats', 'id': 7},
+                {'op': 'move', 'game': 1, 'move': 'e2e4'}
+            )
+        self.assertEqual(replies[0], {'error': 'fen must be a str, not int'})
+        self.assertEqual(replies[1]['game'], 1)
+        self.assertEqual(replies[2], {'error': 'unknown game: [1]'})
+        self.assertEqual(replies[3], {'error': 'unknown game: True'})
+        self.assertEqual(replies[4], {'error': 'move must be a str, not list', 'game': 1})
+        self.assertEqual(replies[5], {'error': 'piece must be a str, not int', 'game': 1})
+        self.assertEqual(replies[6], {'error': "internal error: KeyError('boom')", 'id': 7})
+        self.assertEqual(replies[7]['player'], 'b')
+
+    def test_promotion(self):
+        fen = '7k/4P3/8/8/8/8/8/4K3 w - -'
+        _, replies = self.run_requests(
+            {'op': 'new', 'fen': fen},
+            {'op': 'move', 'game': 1, 'move': 'e7e8'},
+            {'op': 'move', 'game': 1, 'move': 'e1d1'},
+            {'op': 'promote', 'game': 1, 'piece': 'k'},
+            {'op': 'promote', 'game': 1, 'piece': 'r'},
+            {'op': 'new', 'fen': fen},
+            {'op': 'move', 'game': 2, 'move': 'e7e8q'},
+            {'op': 'move', 'game': 2, 'move': 'e1e2q'}
+        )
+        self.assertEqual(replies[1]['promotion'], 'e8')
+        self.assertEqual(replies[1]['status'], None)
+        self.assertEqual(replies[2]['error'], 'pending promotion!')
+        self.assertEqual(replies[3]['error'], 'invalid promotion!')
+        self.assertEqual(replies[4]['fen'], '4R2k/8/8/8/8/8/8/4K3 b - - 0 1')
+        self.assertEqual(replies[4]['promotion'], None)
+        self.assertEqual(replies[4]['check'], True)
+        self.assertEqual(replies[6]['fen'], '4Q2k/8/8/8/8/8/8/4K3 b - - 0 1')
+        self.assertIn('error', replies[7])
+
+    def test_draws(self):
+        shuffle = ['g1f3', 'g8f6', 'f3g1', 'f6g8'] * 2
+        _, replies = self.run_requests(
+            {'op': 'new'}, *({'op': 'move', 'game': 1, 'move': move} for move in shuffle),
+            {'op': 'new', 'fen': '8/8/8/8/8/3k4/5r2/4K3 w - -'},
+            {'op': 'move', 'game': 2, 'move': 'e1f2'},
+            {'op': 'new', 'fen': '7k/5Q2/6K1/8/8/8/8/8 b - -'}
+        )
+        self.assertEqual([reply['status'] for reply in replies[4:9]], [None] * 4 + ['threefold repetition'])
+        self.assertEqual(replies[8]['result'], '1/2-1/2')
+        self.assertEqual(replies[10]['status'], 'insufficient material')
+        self.assertEqual(replies[11]['status'], 'stalemate')
+
+    def test_batches(self):
+        requests = [{'op': 'new'} for _ in range(1000)]
+        requests += [{'op': 'move', 'game': i, 'move': 'e2e4'} for i in range(1, 1001)]
+        game_server, replies = self.run_requests(*requests, batch=100)
+        self.assertEqual(len(game_server.games), 1000)
+        self.assertTrue(all(reply['player'] == 'b' for reply in replies[1000:]))
+        self.assertGreaterEqual(game_server.stats()['mean_batch'], 50)
+
+    def test_connection(self):
+
+        async def session():
+            game_server = server.GameServer()
+            runner = asyncio.ensure_future(game_server.run())
+            listener = await asyncio.start_server(game_server.connection, '127.0.0.1', 0)
+            reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+            writer.write(b'{"op": "new"}\n\n{"op": "move", "game": 1, "move": "e2e4"}\n{"op":\n')
+            await writer.drain()
+            writer.write_eof()
+            replies = [json.loads(line) async for line in reader]
+            writer.close()
+            listener.close()
+            runner.cancel()
+            return replies
+
+        replies = asyncio.run(session())
+        self.assertEqual(len(replies), 3)
+        self.assertEqual(replies[1]['fen'], 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1')
+        self.assertTrue(replies[2]['error'].startswith('invalid JSON'))
+
+if __name__ == '__main__':
+    unittest.main()
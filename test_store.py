@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+import chess
+import store
+
+FENS = [
+    chess.START_FEN,
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -',
+    'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq -',
+    'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ -',
+    'rnbqkbnr/ppppp2p/8/5Pp1/8/8/PPPP1PPP/RNBQKBNR w KQkq g6'
+]
+
+class TestStore(unittest.TestCase):
+
+    def test_bytes(self):
+        for fen in FENS:
+            chess_board = chess.ChessBoard.from_fen(fen)
+            for _, next_board in chess._successors(chess_board):
+                with self.subTest(fen=next_board.to_fen()):
+                    data = next_board.to_bytes()
+                    self.assertEqual(len(data), chess.PACKED_BYTES)
+                    self.assertEqual(chess.ChessBoard.from_bytes(data), next_board)
+        # a king keeps its castling flag without a rook to castle with
+        chess_board = chess.ChessBoard.from_fen('4k3/8/8/8/8/8/8/4K3 w - -')
+        chess_board = chess_board._replace(board=chess_board.board[:95] + b'\x0f' + chess_board.board[96:],
+                                          key=None, pieces=None, signature=None)
+        self.assertEqual(chess.ChessBoard.from_bytes(chess_board.to_bytes()).board, chess_board.board)
+
+    def test_store(self):
+        chess_boards = [next_board for fen in FENS
+                        for _, next_board in chess._successors(chess.ChessBoard.from_fen(fen))]
+        positions = store.PositionStore()
+        positions.extend(chess_boards)
+        positions.extend(chess_boards)
+        self.assertEqual(len(positions), len(set(b.to_bytes() for b in chess_boards)))
+        self.assertEqual(len(positions.tobytes()), len(positions) * chess.PACKED_BYTES)
+        for chess_board in chess_boards:
+            self.assertEqual(positions[positions.index(chess_board)], chess_board)
+        self.assertNotIn(chess.ChessBoard.from_fen('4k3/8/8/8/8/8/8/4K3 w - -'), positions)
+        self.assertRaises(IndexError, positions.__getitem__, len(positions))
+
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            positions.save(filename)
+            loaded = store.PositionStore.load(filename)
+            self.assertEqual(list(loaded), list(positions))
+            self.assertEqual(loaded.append(chess_boards[-1]), positions.index(chess_boards[-1]))
+        finally:
+            os.remove(filename)
+        positions = store.PositionStore(dedup=False)
+        positions.extend(chess_boards[:3] * 2)
+        self.assertEqual(len(positions), 6)
+        self.assertEqual(positions.index(chess_boards[2]), 2)
@@ -0,0 +1,69 @@
+import random
+import shutil
+import tempfile
+import unittest
+
+import chess
+import search
+import tablebase
+
+class TestTablebase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        tablebase.generate('KQK', cls.directory)
+        cls.tablebase = tablebase.Tablebase(cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_probe(self):
+        for fen, result in [
+            ('k7/8/1K6/8/8/8/8/6Q1 w - -', (1, 1)),
+            ('Q1k5/8/2K5/8/8/8/8/8 b - -', (-1, 0)),
+            ('k7/8/1Q6/8/8/8/8/2K5 b - -', (0, 0)), # stalemate
+            ('K7/8/1k6/8/8/8/8/7q w - -', (-1, 2)), # mirrored, the queen is black's
+            ('8/8/8/8/4k3/8/8/K7 w - -', (0, 0)),
+            ('8/8/8/8/4k3/8/8/K6N w - -', (0, 0))
+        ]:
+            with self.subTest(fen=fen):
+                self.assertEqual(self.tablebase.probe(chess.ChessBoard.from_fen(fen)), result)
+        self.assertIsNone(self.tablebase.probe(chess.new_game()))
+        self.assertIsNone(self.tablebase.probe(chess.ChessBoard.from_fen('8/8/8/8/4k3/8/8/K6R w - -')))
+        self.assertRaises(ValueError, tablebase.normalize, 'KPKP')
+        self.assertEqual(tablebase.normalize('kkq'), 'KQK')
+
+    def test_retrograde(self):
+        # every result follows from the results one move later
+        rng = random.Random(0)
+        for _ in range(200):
+            squares = rng.sample(chess._SQUARES, 3)
+            board = bytearray(chess._EMPTY_BOARD)
+            for square, piece in zip(squares, (7, 39, 6)):
+                board[square] = piece
+            player = rng.random() < 0.5
+            if chess._under_attack(board, squares[1] if player else squares[0], player):
+                continue
+            check = chess._under_attack(board, squares[0] if player else squares[1], not player)
+            chess_board = chess.ChessBoard(bytes(board), player, 0, 0, squares[0], squares[1], check)
+            result = self.tablebase.probe(chess_board)
+            children = [self.tablebase.probe(next_board) for _, next_board in chess._successors(chess_board)]
+            with self.subTest(fen=chess_board.to_fen()):
+                if not children:
+                    self.assertEqual(result, (-1, 0) if check else (0, 0))
+                elif result.wdl > 0:
+                    self.assertEqual(min(c.dtm for c in children if c.wdl < 0), result.dtm - 1)
+                elif result.wdl < 0:
+                    self.assertTrue(all(c.wdl > 0 for c in children))
+                    self.assertEqual(max(c.dtm for c in children), result.dtm - 1)
+                else:
+                    self.assertFalse(any(c.wdl < 0 for c in children))
+
+    def test_search(self):
+        chess_board = chess.ChessBoard.from_fen('8/8/3k4/8/8/8/8/K6Q w - -')
+        result = search.Searcher(tablebase=self.tablebase).search(chess_board, search.Limits(depth=2))
+        self.assertEqual(result.mate, (self.tablebase.probe(chess_board).dtm + 1) // 2)
+        next_board = chess.play_move(chess_board, result.move)
+        self.assertEqual(self.tablebase.probe(next_board).dtm, self.tablebase.probe(chess_board).dtm - 1)
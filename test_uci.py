@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+
+import chess
+import uci
+
+class TestUci(unittest.TestCase):
+
+    def run_commands(self, *commands, pause=0.0):
+        lines = []
+
+        async def session():
+            engine = uci.Engine(lines.append)
+            for command in commands:
+                if command == 'pause':
+                    await asyncio.sleep(pause)
+                elif not await engine.command(command):
+                    break
+            await engine.wait()
+
+        asyncio.run(session())
+        return lines
+
+    def test_handshake(self):
+        lines = self.run_commands('uci', 'isready', 'foo', 'quit')
+        self.assertEqual(lines[-3:], ['uciok', 'readyok', 'info string unknown command: foo'])
+
+    def test_go(self):
+        lines = self.run_commands('position startpos moves e2e4 e7e5 g1f3', 'go depth 2')
+        self.assertEqual([line.split()[2] for line in lines if line.startswith('info')], ['1', '2'])
+        chess_board = chess.new_game()
+        for square, position in [('e2', 'e4'), ('e7', 'e5'), ('g1', 'f3')]:
+            chess_board = chess.move(chess_board, square, position)
+        self.assertIn(lines[-1].split()[1], map(chess._move2an, chess.generate_moves(chess_board)))
+        # promotions are written like e7e8q
+        lines = self.run_commands('position fen 7k/4P3/5K2/8/8/8/8/8 w - - moves e7e8q h8h7', 'go depth 1')
+        chess_board = chess.ChessBoard.from_fen('4Q3/7k/5K2/8/8/8/8/8 w - -')
+        self.assertIn(lines[-1].split()[1], map(chess._move2an, chess.generate_moves(chess_board)))
+        lines = self.run_commands('position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - -', 'go nodes 2000')
+        self.assertEqual(lines[-1], 'bestmove a1a8')
+        self.assertIn('score mate 1', lines[-2])
+        lines = self.run_commands('position fen 7k/5Q2/6K1/8/8/8/8/8 b - -', 'go depth 1')
+        self.assertEqual(lines, ['bestmove 0000'])
+        lines = self.run_commands('position startpos moves e2e5', 'position fen 8/8/8 w - -')
+        self.assertEqual(lines, ['info string e2e5 invalid move!', 'info string 8/8/8 w - - is not a valid FEN!'])
+
+    def test_stop(self):
+        # readyok comes back while searching, bestmove only after stop
+        lines = self.run_commands('position startpos', 'go infinite', 'isready', 'pause', 'stop', pause=0.2)
+        self.assertIn('readyok', lines)
+        self.assertTrue(lines[-1].startswith('bestmove '))
+        self.assertEqual(sum(line.startswith('bestmove') for line in lines), 1)
+        lines = self.run_commands('go movetime 100000', 'stop')
+        self.assertTrue(lines[-1].startswith('bestmove '))
+        # a stop for an infinite search that already returned leaves the next search alone
+        lines = self.run_commands('position fen 7k/8/6Q1/8/8/8/8/K7 b - -', 'go infinite', 'pause', 'stop',
+                                  'position startpos', 'go depth 4', pause=0.1)
+        self.assertEqual(lines[0], 'bestmove 0000')
+        self.assertEqual([line.split()[2] for line in lines if line.startswith('info')], ['1', '2', '3', '4'])
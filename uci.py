@@ -0,0 +1,145 @@
+import asyncio
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import search
+
+NAME = 'chess.py'
+
+class Engine:
+    """A UCI session: commands are handled on the event loop while the
+    search runs in a worker thread, so isready and stop are answered at
+    once. The Searcher and its tables are kept between moves."""
+
+    def __init__(self, write, searcher=None):
+        self.write = write
+        self.searcher = searcher or search.Searcher()
+        self.chess_board = chess.new_game()
+        self._executor = ThreadPoolExecutor(1)
+        self._task = None
+        self._searching = False # while the worker thread runs the search
+        self._ponder = None # set while go infinite waits for stop
+
+    async def command(self, line):
+        # handles one line, False after quit
+        command, *args = line.split() or ('',)
+        if command == 'uci':
+            self.write(f'id name {NAME}')
+            self.write('uciok')
+        elif command == 'isready':
+            self.write('readyok')
+        elif command == 'ucinewgame':
+            await self.wait()
+            self.searcher.clear()
+            self.chess_board = chess.new_game()
+        elif command == 'position':
+            await self.wait()
+            try:
+                self.chess_board = self._position(args)
+            except (chess.FenError, chess.MoveError, chess.SquareError) as e:
+                self.write(f'info string {e}')
+        elif command == 'go':
+            await self.wait()
+            self._go(args)
+        elif command == 'stop':
+            self.stop()
+            await self.wait()
+        elif command == 'quit':
+            self.stop()
+            await self.wait()
+            self._executor.shutdown()
+            return False
+        elif command:
+            self.write(f'info string unknown command: {command}')
+        return True
+
+    def stop(self):
+        if self._task is not None:
+            # a search that already returned must not see the flag, it would
+            # cut the next one short
+            if self._searching:
+                self.searcher.stop()
+            if self._ponder is not None:
+                self._ponder.set()
+
+    async def wait(self):
+        # until the running search has sent its bestmove
+        if self._task is not None:
+            await self._task
+
+    def _position(self, args):
+        if args[:1] == ['startpos']:
+            chess_board, args = chess.new_game(), args[1:]
+        elif args[:1] == ['fen']:
+            end = args.index('moves') if 'moves' in args else len(args)
+            chess_board, args = chess.ChessBoard.from_fen(' '.join(args[1:end])), args[end:]
+        else:
+            raise chess.FenError('position needs startpos or fen')
+        for an in args[1:] if args[:1] == ['moves'] else ():
+            moves = {chess._move2an(packed): packed for packed in chess.generate_moves(chess_board)}
+            if an not in moves:
+                raise chess.MoveError(f'{an} invalid move!')
+            chess_board = chess.play_move(chess_board, moves[an])
+        return chess_board
+
+    def _go(self, args):
+        options = {}
+        for i, arg in enumerate(args):
+            if arg in ('depth', 'movetime', 'nodes', 'wtime', 'btime', 'winc', 'binc', 'movestogo'):
+                try:
+                    options[arg] = int(args[i + 1])
+                except (IndexError, ValueError):
+                    pass
+        movetime = options['movetime'] / 1000 if 'movetime' in options else None
+        remaining = options.get('wtime' if self.chess_board.player else 'btime')
+        if movetime is None and remaining is not None:
+            # a share of the clock plus half the increment, never more than half of it
+            increment = options.get('winc' if self.chess_board.player else 'binc', 0)
+            movetime = min(remaining / options.get('movestogo', 30) + increment / 2, remaining / 2) / 1000
+        limits = search.Limits(depth=options.get('depth'), movetime=movetime, nodes=options.get('nodes'))
+        self._ponder = asyncio.Event() if 'infinite' in args else None
+        self._searching = True
+        self._task = asyncio.ensure_future(self._search(self.chess_board, limits))
+
+    async def _search(self, chess_board, limits):
+        loop = asyncio.get_running_loop()
+        info = lambda result: loop.call_soon_threadsafe(self.write, _info(result))
+        try:
+            try:
+                result = await loop.run_in_executor(self._executor, self.searcher.search, chess_board, limits, info)
+            finally:
+                # a stop sent as the search returned is dropped
+                self._searching = self.searcher.stopped = False
+            # an infinite search only answers stop
+            if self._ponder is not None:
+                await self._ponder.wait()
+            self.write(f'bestmove {chess._move2an(result.move) if result.move else "0000"}')
+        finally:
+            self._task = self._ponder = None
+
+def _info(result):
+    score = f'mate {result.mate}' if result.mate is not None else f'cp {result.score}'
+    return (f'info depth {result.depth} score {score} nodes {result.nodes} nps {result.nps} '
+            f'time {round(result.seconds * 1000)} pv {" ".join(map(chess._move2an, result.pv))}')
+
+async def main():
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    def write(line):
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+
+    engine = Engine(write)
+    while True:
+        line = await reader.readline()
+        if not line or not await engine.command(line.decode()):
+            break
+    engine.stop()
+    await engine.wait()
+
+if __name__ == '__main__':
+    asyncio.run(main())